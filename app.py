@@ -1,23 +1,124 @@
 import os
-import base64
 import binascii
-from urllib.parse import urlparse
-from typing import List, Optional, Tuple
+import hashlib
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
-import re
+import math
 import time
 
-from google.cloud import vision
-from google.api_core.exceptions import GoogleAPICallError, RetryError
+import metrics
+from image_preprocess import PayloadTooLarge, decode_base64, prepare_for_vision, read_upload
+from job_queue import JobQueue, QueueFull
+from metrics import record_cache_lookup, record_upstream, stage
+from parse_pool import PARSE_POOL
+from phash_index import NearDuplicateIndex, dhash
+from result_cache import ResultCache
+from scraping import Scraper, scrape_response
+from signal_matchers import SignalTableLoader
+from single_flight import SingleFlight
+from streaming import relay, stream_mode, stream_response
+from vision_guard import CircuitBreaker, CircuitOpen, VisionGuard
+
+if TYPE_CHECKING:
+    # google.cloud.vision pulls in the whole protobuf/gRPC stack, so it is only
+    # imported by the functions that need it; /health and /scrape never do.
+    from google.cloud import vision
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+metrics.init_app(app)  # Request instrumentation and GET /metrics
+
+VISION_CLIENT: Optional['vision.ImageAnnotatorClient'] = None
+VISION_CLIENT_PID: Optional[int] = None
+VISION_CLIENT_LOCK = threading.Lock()
+
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+SCRAPE_BATCH_MAX_URLS = int(os.environ.get('SCRAPE_BATCH_MAX_URLS', 50))
+
+# Vision accepts at most 16 images per synchronous batch_annotate_images call.
+VISION_BATCH_SIZE = max(1, min(16, int(os.environ.get('VISION_BATCH_SIZE', 16))))
+# Vision also caps the size of one request, so a call carries at most this many
+# bytes of images; an image larger than this on its own still goes alone.
+VISION_BATCH_REQUEST_BYTES = int(os.environ.get('VISION_BATCH_REQUEST_BYTES', 8 * 1024 * 1024))
+VISION_BATCH_MAX_ITEMS = int(os.environ.get('VISION_BATCH_MAX_ITEMS', 64))
+# Request body limits: one base64-encoded image plus JSON overhead, and a cap for batches.
+MAX_REQUEST_BYTES = MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024
+VISION_BATCH_MAX_BYTES = int(os.environ.get('VISION_BATCH_MAX_BYTES', 64 * 1024 * 1024))
+VISION_JOB_RETRY_AFTER = int(os.environ.get('VISION_JOB_RETRY_AFTER', 5))
+
+# Analysed payloads keyed by image content hash (or normalised URL), scoped to
+# the feature profile and signal tables that scored them. Set VISION_CACHE_PATH
+# to persist results across worker restarts; the file keeps at most
+# VISION_CACHE_DISK_ENTRIES of the newest results.
+VISION_RESULT_CACHE = ResultCache(
+    max_entries=int(os.environ.get('VISION_CACHE_SIZE', 512)),
+    ttl_seconds=float(os.environ.get('VISION_CACHE_TTL', 86400)),
+    db_path=os.environ.get('VISION_CACHE_PATH'),
+    name='vision',
+    max_disk_entries=int(os.environ.get('VISION_CACHE_DISK_ENTRIES', 50000)),
+)
+
+# Coalesce identical in-flight scrapes and Vision calls. SINGLE_FLIGHT_LOCK_DIR
+# extends coalescing across workers, for Vision when VISION_CACHE_PATH is set
+# and for scrapes when SCRAPE_CONTENT_STORE_PATH is set.
+SCRAPE_FLIGHTS = SingleFlight('scrape', lock_dir=os.environ.get('SINGLE_FLIGHT_LOCK_DIR'))
+VISION_FLIGHTS = SingleFlight('vision', lock_dir=os.environ.get('SINGLE_FLIGHT_LOCK_DIR'))
+
+SCRAPER = Scraper(flights=SCRAPE_FLIGHTS)
 
-VISION_CLIENT: Optional[vision.ImageAnnotatorClient] = None
+# Every Vision call gets VISION_TIMEOUT seconds in total, retries included.
+# After VISION_BREAKER_FAILURES consecutive upstream failures, calls fail fast
+# with 503 for VISION_BREAKER_RESET seconds. VISION_HEDGE_AFTER > 0 sends a
+# second attempt when the first is slower than that, for at most
+# VISION_HEDGE_MAX_RATIO of calls.
+VISION_GUARD = VisionGuard(
+    CircuitBreaker(
+        'vision',
+        failure_threshold=int(os.environ.get('VISION_BREAKER_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('VISION_BREAKER_RESET', 30)),
+    ),
+    timeout=float(os.environ.get('VISION_TIMEOUT', 10)),
+    hedge_after=float(os.environ.get('VISION_HEDGE_AFTER', 0)),
+    hedge_max_ratio=float(os.environ.get('VISION_HEDGE_MAX_RATIO', 0.1)),
+)
+# Keepalive pings stop idle connections to Vision being dropped silently by
+# NAT or load balancers, which would otherwise cost the next call its deadline.
+VISION_KEEPALIVE_SECONDS = int(os.environ.get('VISION_KEEPALIVE_SECONDS', 30))
+
+# Perceptual hashes of analysed uploads, so re-encoded or resized copies of an
+# image reuse its cached result. VISION_PHASH_DISTANCE=0 turns this off.
+NEAR_DUPLICATES = NearDuplicateIndex(
+    max_distance=int(os.environ.get('VISION_PHASH_DISTANCE', 4)),
+    capacity=int(os.environ.get('VISION_PHASH_INDEX_SIZE', 10000)),
+)
+
+# Which Vision features to request. 'standard' asks only for what
+# evaluate_ai_signals and build_analysis_payload read; 'full' adds image
+# properties, logos and text. 'two-phase' asks for labels and safe search first
+# and fetches web detection and objects only when that first score is
+# ambiguous, i.e. between AI_POSSIBLE_SCORE and AI_LIKELY_SCORE.
+VISION_FEATURE_PROFILES: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    'standard': (('LABEL_DETECTION', 'SAFE_SEARCH_DETECTION', 'WEB_DETECTION', 'OBJECT_LOCALIZATION'),),
+    'full': ((
+        'LABEL_DETECTION', 'SAFE_SEARCH_DETECTION', 'WEB_DETECTION', 'OBJECT_LOCALIZATION',
+        'IMAGE_PROPERTIES', 'LOGO_DETECTION', 'TEXT_DETECTION',
+    ),),
+    'two-phase': (('LABEL_DETECTION', 'SAFE_SEARCH_DETECTION'), ('WEB_DETECTION', 'OBJECT_LOCALIZATION')),
+}
+VISION_FEATURE_MAX_RESULTS = {
+    'LABEL_DETECTION': 10, 'WEB_DETECTION': 10, 'OBJECT_LOCALIZATION': 10, 'LOGO_DETECTION': 5, 'TEXT_DETECTION': 5,
+}
+VISION_FEATURE_PROFILE = os.environ.get('VISION_FEATURE_PROFILE', 'standard').strip().lower()
+VISION_PHASES = VISION_FEATURE_PROFILES.get(VISION_FEATURE_PROFILE, VISION_FEATURE_PROFILES['standard'])
+
+# Verdict thresholds; scores between them are the ambiguous band.
+AI_LIKELY_SCORE = 75
+AI_POSSIBLE_SCORE = 45
 
 AI_LABEL_KEYWORDS = {
     'ai generated', 'ai-generated', 'artificial', 'synthetic', 'digital art', 'digital painting',
@@ -38,23 +139,90 @@ AI_HEAVY_DOMAINS = {
     'fotor.ai', 'picsart.com'
 }
 
-LIKELIHOOD_NAMES = {
-    vision.Likelihood.UNKNOWN: 'Unknown',
-    vision.Likelihood.VERY_UNLIKELY: 'Very unlikely',
-    vision.Likelihood.UNLIKELY: 'Unlikely',
-    vision.Likelihood.POSSIBLE: 'Possible',
-    vision.Likelihood.LIKELY: 'Likely',
-    vision.Likelihood.VERY_LIKELY: 'Very likely',
-}
+# Compiled matchers for the sets above. SIGNAL_KEYWORDS_PATH can point at a JSON
+# file with extra "aiLabelKeywords", "humanPhotoKeywords" and "aiHeavyDomains";
+# it is re-read whenever it changes.
+SIGNAL_TABLES = SignalTableLoader(
+    AI_LABEL_KEYWORDS,
+    HUMAN_PHOTO_KEYWORDS,
+    AI_HEAVY_DOMAINS,
+    path=os.environ.get('SIGNAL_KEYWORDS_PATH'),
+    reload_interval=float(os.environ.get('SIGNAL_KEYWORDS_RELOAD_SECONDS', 30)),
+)
 
 
-def get_vision_client() -> vision.ImageAnnotatorClient:
-    global VISION_CLIENT
-    if VISION_CLIENT is None:
-        VISION_CLIENT = vision.ImageAnnotatorClient()
+@lru_cache(maxsize=None)
+def likelihood_names() -> Dict['vision.Likelihood', str]:
+    from google.cloud import vision
+
+    return {
+        vision.Likelihood.UNKNOWN: 'Unknown',
+        vision.Likelihood.VERY_UNLIKELY: 'Very unlikely',
+        vision.Likelihood.UNLIKELY: 'Unlikely',
+        vision.Likelihood.POSSIBLE: 'Possible',
+        vision.Likelihood.LIKELY: 'Likely',
+        vision.Likelihood.VERY_LIKELY: 'Very likely',
+    }
+
+
+def get_vision_client() -> 'vision.ImageAnnotatorClient':
+    global VISION_CLIENT, VISION_CLIENT_PID
+    # gRPC channels do not survive a fork, so with preload_app every worker builds its own.
+    if VISION_CLIENT is None or VISION_CLIENT_PID != os.getpid():
+        with VISION_CLIENT_LOCK:
+            if VISION_CLIENT is None or VISION_CLIENT_PID != os.getpid():
+                VISION_CLIENT = build_vision_client()
+                VISION_CLIENT_PID = os.getpid()
     return VISION_CLIENT
 
 
+def build_vision_client() -> 'vision.ImageAnnotatorClient':
+    """One client per process; its gRPC channel multiplexes every request thread's calls."""
+    from google.cloud import vision
+    from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcTransport
+
+    options = [
+        # The library's own defaults, which a custom channel would otherwise lose.
+        ('grpc.max_send_message_length', -1),
+        ('grpc.max_receive_message_length', -1),
+    ]
+    if VISION_KEEPALIVE_SECONDS > 0:
+        options += [
+            ('grpc.keepalive_time_ms', VISION_KEEPALIVE_SECONDS * 1000),
+            ('grpc.keepalive_timeout_ms', 10000),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0),
+        ]
+    channel = ImageAnnotatorGrpcTransport.create_channel(options=options)
+    return vision.ImageAnnotatorClient(transport=ImageAnnotatorGrpcTransport(channel=channel))
+
+
+def warm_up(timeout: float = 10) -> None:
+    """Import the lazily loaded dependencies and connect the Vision channel.
+
+    Run in a background thread (VISION_WARMUP=1) so the first real request
+    finds everything loaded. Failures are only logged; requests retry them.
+    """
+    started = time.perf_counter()
+    try:
+        import requests  # noqa: F401
+        from bs4 import BeautifulSoup  # noqa: F401
+
+        client = get_vision_client()
+        import grpc
+
+        grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=timeout)
+    except Exception as exc:
+        print(f"Warm-up incomplete: {exc}")
+        return
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+def start_warm_up() -> None:
+    if os.environ.get('VISION_WARMUP', '0') == '1':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
 def normalise_domain(raw_url: Optional[str]) -> str:
     if not raw_url:
         return ''
@@ -65,17 +233,57 @@ def normalise_domain(raw_url: Optional[str]) -> str:
         return ''
 
 
+def normalise_url(raw_url: str) -> Optional[str]:
+    try:
+        parsed = urlparse(raw_url.strip())
+    except ValueError:
+        return None
+    return urlunparse((
+        parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/', parsed.params, parsed.query, '',
+    ))
+
+
+def is_http_url(value) -> bool:
+    """True for a string that parses as an http(s) URL with a host."""
+    if not isinstance(value, str):
+        return False
+    try:
+        parsed = urlparse(value.strip())
+        return parsed.scheme in ('http', 'https') and bool(parsed.hostname)
+    except ValueError:
+        return False
+
+
+def cache_key_scope() -> str:
+    """What a cached verdict depends on besides the image: feature profile and signal tables."""
+    profile = VISION_FEATURE_PROFILE if VISION_FEATURE_PROFILE in VISION_FEATURE_PROFILES else 'standard'
+    return f'{profile}/{SIGNAL_TABLES.get().version}|'
+
+
+def build_image_cache_key(image_bytes: Optional[bytes], image_url: Optional[str]) -> Optional[str]:
+    if image_bytes:
+        return cache_key_scope() + 'sha256:' + hashlib.sha256(image_bytes).hexdigest()
+    if image_url:
+        normalised = normalise_url(image_url)
+        return cache_key_scope() + 'url:' + normalised if normalised else None
+    return None
+
+
 def get_likelihood_name(value: Optional[int]) -> str:
+    from google.cloud import vision
+
     if value is None:
         return 'Unknown'
     try:
         likelihood = vision.Likelihood(value)
     except ValueError:
         return 'Unknown'
-    return LIKELIHOOD_NAMES.get(likelihood, 'Unknown')
+    return likelihood_names().get(likelihood, 'Unknown')
+
 
+def gather_safe_search_warnings(safe_search: Optional['vision.SafeSearchAnnotation']) -> List[str]:
+    from google.cloud import vision
 
-def gather_safe_search_warnings(safe_search: Optional[vision.SafeSearchAnnotation]) -> List[str]:
     if not safe_search:
         return []
 
@@ -92,6 +300,7 @@ def gather_safe_search_warnings(safe_search: Optional[vision.SafeSearchAnnotatio
 def evaluate_ai_signals(
     labels, web_detection, object_annotations,
 ) -> tuple[int, List[str], List[str], List[str]]:
+    tables = SIGNAL_TABLES.get()
     ai_score = 25
     ai_indicators: List[str] = []
     support_signals: List[str] = []
@@ -104,13 +313,13 @@ def evaluate_ai_signals(
         lowered = description.lower()
         score_percent = int(round(float(label.score or 0) * 100))
 
-        if any(keyword in lowered for keyword in AI_LABEL_KEYWORDS):
+        if tables.ai_labels.matches(lowered):
             delta = min(40, int(round(float(label.score or 0) * 100 * 0.6)))
             ai_score += delta
             ai_indicators.append(
                 f'Vision label "{description}" ({score_percent}% confidence) is commonly tied to synthetic or illustrated imagery.'
             )
-        elif any(keyword in lowered for keyword in HUMAN_PHOTO_KEYWORDS):
+        elif tables.human_photos.matches(lowered):
             delta = int(round(float(label.score or 0) * 100 * 0.4))
             ai_score -= delta
             support_signals.append(
@@ -123,12 +332,12 @@ def evaluate_ai_signals(
             if not label_text:
                 continue
             lowered = label_text.lower()
-            if any(keyword in lowered for keyword in AI_LABEL_KEYWORDS):
+            if tables.ai_labels.matches(lowered):
                 ai_score += 20
                 ai_indicators.append(
                     f'Vision best-guess "{label_text}" suggests illustration or generative art.'
                 )
-            elif any(keyword in lowered for keyword in HUMAN_PHOTO_KEYWORDS):
+            elif tables.human_photos.matches(lowered):
                 ai_score -= 10
                 support_signals.append(
                     f'Best-guess "{label_text}" is consistent with authentic photography.'
@@ -138,7 +347,7 @@ def evaluate_ai_signals(
             domain = normalise_domain(page.url)
             if not domain:
                 continue
-            if any(domain.endswith(ai_domain) or ai_domain in domain for ai_domain in AI_HEAVY_DOMAINS):
+            if tables.ai_domains.matches(domain):
                 suspicious_domains.append(domain)
 
         if suspicious_domains:
@@ -162,9 +371,9 @@ def evaluate_ai_signals(
 
 
 def score_to_verdict(score: int) -> str:
-    if score >= 75:
+    if score >= AI_LIKELY_SCORE:
         return 'Likely AI-generated'
-    if score >= 45:
+    if score >= AI_POSSIBLE_SCORE:
         return 'Possibly AI-assisted'
     return 'Likely human-captured'
 
@@ -219,180 +428,118 @@ def build_suggestions(web_detection, warnings: List[str]) -> List[str]:
         suggestions.append('Run a reverse image search to establish provenance before resharing.')
 
     return suggestions[:6]
-def clean_text(text):
-    """Clean extracted text by removing extra whitespace and formatting"""
-    # Replace multiple whitespace characters with single space
-    text = re.sub(r'\s+', ' ', text)
-    # Remove leading/trailing whitespace
-    text = text.strip()
-    return text
-
-def extract_main_content(soup):
-    """Extract main content from BeautifulSoup object"""
-    # Remove script, style, and other non-content elements
-    for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form']):
-        element.decompose()
-    
-    # Try to find main content containers in order of preference
-    content_selectors = [
-        'article',
-        'main',
-        '[role="main"]',
-        '.content',
-        '.article',
-        '.post',
-        '.entry',
-        '#content',
-        '#main'
+
+
+def build_vision_features(phase: int = 0) -> List['vision.Feature']:
+    """Features for one phase of the configured profile."""
+    from google.cloud import vision
+
+    return [
+        vision.Feature(type_=vision.Feature.Type[name], max_results=VISION_FEATURE_MAX_RESULTS.get(name, 0))
+        for name in VISION_PHASES[phase]
     ]
-    
-    main_content = None
-    for selector in content_selectors:
-        main_content = soup.select_one(selector)
-        if main_content and len(main_content.get_text().strip()) > 100:
-            break
-    
-    # Fallback to body if no main content found
-    if not main_content:
-        main_content = soup.find('body')
-    
-    if not main_content:
-        return ""
-    
-    # Extract text and clean it
-    text = main_content.get_text()
-    return clean_text(text)
 
-@app.route('/scrape', methods=['POST'])
-def scrape_url():
-    """Scrape content from a given URL using Beautiful Soup"""
-    try:
-        data = request.get_json()
-        url = data.get('url')
-        
-        if not url:
-            return jsonify({'error': 'URL is required'}), 400
-        
-        # Validate URL format
-        if not url.startswith(('http://', 'https://')):
-            return jsonify({'error': 'URL must start with http:// or https://'}), 400
-        
-        # Set headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        
-        # Make request with timeout
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Extract main content
-        content = extract_main_content(soup)
-        
-        if not content or len(content.strip()) < 50:
-            return jsonify({'error': 'No readable content found on the page'}), 400
-        
-        # Limit content length to prevent overly long responses
-        if len(content) > 10000:
-            content = content[:10000] + "..."
-        
-        return jsonify({
-            'content': content,
-            'title': soup.title.string if soup.title else 'No title found',
-            'url': url
-        })
-        
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Request timed out. The website may be slow or unresponsive.'}), 408
-    
-    except requests.exceptions.ConnectionError:
-        return jsonify({'error': 'Failed to connect to the website. Please check the URL and your internet connection.'}), 503
-    
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            return jsonify({'error': 'Page not found (404). Please check the URL.'}), 404
-        elif e.response.status_code == 403:
-            return jsonify({'error': 'Access forbidden (403). The website may be blocking automated requests.'}), 403
-        else:
-            return jsonify({'error': f'HTTP error {e.response.status_code} occurred.'}), e.response.status_code
-    
-    except Exception as e:
-        print(f"Scraping error: {str(e)}")
-        return jsonify({'error': 'An unexpected error occurred while processing the URL.'}), 500
 
+def needs_detail_phase(vision_response: 'vision.AnnotateImageResponse') -> bool:
+    """Whether a first-phase response is ambiguous enough to pay for web detection and objects."""
+    if len(VISION_PHASES) < 2 or vision_response.error.message:
+        return False
+    ai_score, _, _, _ = evaluate_ai_signals(vision_response.label_annotations, None, None)
+    needed = AI_POSSIBLE_SCORE <= ai_score <= AI_LIKELY_SCORE
+    if not needed:
+        record_upstream('vision_detail', 'skipped')
+    return needed
 
-@app.route('/vision/analyze', methods=['POST'])
-def analyze_image_with_vision():
-    """Analyze an image with Google Cloud Vision to surface AI authenticity cues."""
+
+def add_detail_phase(client, endpoint: str, pending: List[Tuple['vision.Image', 'vision.AnnotateImageResponse']]) -> None:
+    """Run the second phase for ambiguous first-phase responses and merge it into them.
+
+    One batch RPC covers every image in ``pending``. If it fails, the
+    first-phase responses are kept, so the verdict is still based on labels.
+    """
+    from google.api_core.exceptions import GoogleAPICallError, RetryError
+
+    if not pending:
+        return
+    features = build_vision_features(1)
     try:
-        client = get_vision_client()
+        with stage(endpoint, 'rpc_detail'):
+            batch_response = VISION_GUARD.call(
+                client.batch_annotate_images,
+                requests=[{'image': image, 'features': features} for image, _ in pending],
+            )
+    except CircuitOpen:
+        return
+    except (GoogleAPICallError, RetryError) as api_error:
+        record_upstream('vision_detail', getattr(api_error, 'code', None) or 'error')
+        print(f"Vision detail call failed, keeping first-phase results: {api_error}")
+        return
     except Exception as exc:  # pragma: no cover - defensive logging
-        print(f"Failed to initialise Vision client: {exc}")
-        return jsonify({'error': 'Failed to initialise Vision client.'}), 500
+        record_upstream('vision_detail', 'error')
+        print(f"Unexpected Vision detail error, keeping first-phase results: {exc}")
+        return
 
-    image_bytes: Optional[bytes] = None
-    image_url: Optional[str] = None
+    for (_, vision_response), detail in zip(pending, batch_response.responses):
+        if detail.error.message:
+            record_upstream('vision_detail', 'response_error')
+            print(f"Vision detail call returned an error: {detail.error.message}")
+            continue
+        record_upstream('vision_detail', 'ok')
+        # The detail response only carries web detection and objects.
+        type(vision_response).pb(vision_response).MergeFrom(type(detail).pb(detail))
 
-    if 'image' in request.files:
-        uploaded = request.files['image']
-        image_bytes = uploaded.read()
-    else:
-        payload = request.get_json(silent=True) or {}
-        base64_payload = payload.get('imageBase64') or payload.get('image_base64')
-        image_url = payload.get('imageUrl') or payload.get('image_url')
 
-        if base64_payload:
-            try:
-                image_bytes = base64.b64decode(base64_payload, validate=True)
-            except (binascii.Error, ValueError):
-                return jsonify({'error': 'Invalid base64 image payload supplied.'}), 400
+def resolve_image_source(
+    image_bytes: Optional[bytes], base64_payload: Optional[str], image_url: Optional[str],
+) -> Tuple[Optional[bytes], Optional[str]]:
+    """Validate an image payload, raising ValueError with a client-facing message."""
+    # JSON bodies can carry any type in these fields.
+    if base64_payload is not None and not isinstance(base64_payload, str):
+        raise ValueError('imageBase64 must be a base64-encoded string.')
+    if image_url is not None and not isinstance(image_url, str):
+        raise ValueError('imageUrl must be a string.')
+    if base64_payload:
+        try:
+            image_bytes = decode_base64(base64_payload, MAX_IMAGE_BYTES)
+        except PayloadTooLarge:
+            raise ValueError('The image exceeds the 8MB limit supported by Vision analysis.')
+        except (binascii.Error, ValueError):
+            raise ValueError('Invalid base64 image payload supplied.')
 
     if image_bytes:
-        if len(image_bytes) > 8 * 1024 * 1024:
-            return jsonify({'error': 'The image exceeds the 8MB limit supported by Vision analysis.'}), 400
-        image = vision.Image(content=image_bytes)
-    elif image_url:
-        image = vision.Image()
-        image.source.image_uri = image_url
-    else:
-        return jsonify({'error': 'No image payload was provided for Vision analysis.'}), 400
-
-    features = [
-        vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
-        vision.Feature(type_=vision.Feature.Type.SAFE_SEARCH_DETECTION),
-        vision.Feature(type_=vision.Feature.Type.WEB_DETECTION, max_results=10),
-        vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10),
-        vision.Feature(type_=vision.Feature.Type.IMAGE_PROPERTIES),
-        vision.Feature(type_=vision.Feature.Type.LOGO_DETECTION, max_results=5),
-        vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION, max_results=5),
-    ]
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            raise ValueError('The image exceeds the 8MB limit supported by Vision analysis.')
+    elif not image_url:
+        raise ValueError('No image payload was provided for Vision analysis.')
+    return image_bytes, image_url
+
 
+def read_uploaded_image(uploaded) -> bytes:
     try:
-        vision_response = client.annotate_image({'image': image, 'features': features})
-    except (GoogleAPICallError, RetryError) as api_error:
-        print(f"Vision API call failed: {api_error}")
-        return jsonify({'error': 'Vision API request failed.', 'details': str(api_error)}), 502
-    except Exception as exc:  # pragma: no cover - defensive logging
-        print(f"Unexpected Vision API error: {exc}")
-        return jsonify({'error': 'Unexpected error while calling Vision API.'}), 500
+        return read_upload(uploaded.stream, MAX_IMAGE_BYTES)
+    except PayloadTooLarge:
+        raise ValueError('The image exceeds the 8MB limit supported by Vision analysis.')
 
-    if vision_response.error.message:
-        print(f"Vision API returned an error: {vision_response.error.message}")
-        return jsonify({'error': 'Vision API returned an error.', 'details': vision_response.error.message}), 502
 
-    ai_score, ai_signals, support_signals, suspicious_domains = evaluate_ai_signals(
-        vision_response.label_annotations,
-        vision_response.web_detection,
-        vision_response.localized_object_annotations,
-    )
+def build_vision_image(image_bytes: Optional[bytes], image_url: Optional[str]) -> 'vision.Image':
+    from google.cloud import vision
+
+    if image_bytes:
+        with stage('vision', 'preprocess'):
+            content = prepare_for_vision(image_bytes)
+        return vision.Image(content=content)
+    image = vision.Image()
+    image.source.image_uri = image_url
+    return image
+
+
+def build_analysis_payload(vision_response: 'vision.AnnotateImageResponse') -> dict:
+    with stage('vision', 'score'):
+        ai_score, ai_signals, support_signals, suspicious_domains = evaluate_ai_signals(
+            vision_response.label_annotations,
+            vision_response.web_detection,
+            vision_response.localized_object_annotations,
+        )
 
     safe_search_warnings = gather_safe_search_warnings(vision_response.safe_search_annotation)
     suggestions = build_suggestions(vision_response.web_detection, safe_search_warnings)
@@ -421,7 +568,7 @@ def analyze_image_with_vision():
         if (label.description or '').strip()
     ]
 
-    response_payload = {
+    return {
         'aiScore': ai_score,
         'verdict': verdict,
         'confidence': confidence,
@@ -434,7 +581,434 @@ def analyze_image_with_vision():
         'suspiciousDomains': sorted(set(suspicious_domains))[:5],
     }
 
-    return jsonify(response_payload)
+
+@app.route('/scrape', methods=['POST'])
+def scrape_url():
+    """Scrape content from a given URL using Beautiful Soup"""
+    data = request.get_json(silent=True) or {}
+    return scrape_response(*SCRAPER.scrape(data.get('url')))
+
+
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_urls_batch():
+    """Scrape several URLs concurrently, streaming each result as it completes.
+
+    Sends NDJSON by default, one result line per URL, or Server-Sent Events
+    with ?stream=sse. SSE streams, and NDJSON streams with ?partial=1, also
+    get a 'partial' event carrying a page's title as soon as it is fetched,
+    before its content has been extracted.
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'Provide a non-empty "urls" list'}), 400
+    if len(urls) > SCRAPE_BATCH_MAX_URLS:
+        return jsonify({'error': f'At most {SCRAPE_BATCH_MAX_URLS} URLs can be scraped per batch'}), 400
+
+    mode = stream_mode(default='ndjson')
+    # NDJSON clients written for one line per URL only get partials when they ask.
+    send_partials = mode == 'sse' or request.args.get('partial') == '1'
+
+    def produce(emit):
+        def on_partial(index, url, fields):
+            emit('partial', {'index': index, 'url': url, **fields})
+
+        partial_callback = on_partial if send_partials else None
+        for index, url, payload, status in SCRAPER.scrape_many(urls, on_partial=partial_callback):
+            if not emit('result', {'index': index, 'url': url, 'status': status, **payload}):
+                return
+
+    return stream_response(relay(produce), mode)
+
+
+def cached_analysis(cache_key: str) -> Optional[Tuple[dict, int]]:
+    cached_payload = VISION_RESULT_CACHE.get(cache_key)
+    return (cached_payload, 200) if cached_payload is not None else None
+
+
+def near_duplicate_analysis(image_bytes: Optional[bytes], cache_key: str) -> Tuple[Optional[int], Optional[dict]]:
+    """Hash an upload and return (hash, cached payload of a near-identical image or None)."""
+    if not image_bytes or not NEAR_DUPLICATES.enabled:
+        return None, None
+    with stage('vision', 'phash'):
+        image_hash = dhash(image_bytes)
+    if image_hash is None:
+        return None, None
+    match_key = NEAR_DUPLICATES.find(image_hash)
+    if match_key and not match_key.startswith(cache_key_scope()):
+        # Scored under another profile or older signal tables.
+        match_key = None
+    cached_payload = VISION_RESULT_CACHE.get(match_key) if match_key else None
+    record_cache_lookup('vision-near-duplicate', cached_payload is not None)
+    if cached_payload is not None:
+        # Store under the exact key too so repeats of this copy skip hashing.
+        VISION_RESULT_CACHE.set(cache_key, cached_payload)
+    return image_hash, cached_payload
+
+
+def vision_unavailable(exc: CircuitOpen) -> dict:
+    return {
+        'error': 'Vision analysis is temporarily unavailable. Please retry shortly.',
+        'retryAfter': math.ceil(exc.retry_after),
+    }
+
+
+def analyze_image(
+    client, image_bytes: Optional[bytes], image_url: Optional[str], cache_key: Optional[str],
+) -> Tuple[dict, int]:
+    """Run one Vision request, returning a JSON-ready payload and the HTTP status to send."""
+    from google.api_core.exceptions import GoogleAPICallError, RetryError
+
+    image = build_vision_image(image_bytes, image_url)
+    try:
+        with stage('vision', 'rpc'):
+            vision_response = VISION_GUARD.call(
+                client.annotate_image, request={'image': image, 'features': build_vision_features(0)},
+            )
+    except CircuitOpen as exc:
+        return vision_unavailable(exc), 503
+    except (GoogleAPICallError, RetryError) as api_error:
+        record_upstream('vision', getattr(api_error, 'code', None) or 'error')
+        print(f"Vision API call failed: {api_error}")
+        return {'error': 'Vision API request failed.', 'details': str(api_error)}, 502
+    except Exception as exc:  # pragma: no cover - defensive logging
+        record_upstream('vision', 'error')
+        print(f"Unexpected Vision API error: {exc}")
+        return {'error': 'Unexpected error while calling Vision API.'}, 500
+
+    if vision_response.error.message:
+        record_upstream('vision', 'response_error')
+        print(f"Vision API returned an error: {vision_response.error.message}")
+        return {'error': 'Vision API returned an error.', 'details': vision_response.error.message}, 502
+    record_upstream('vision', 'ok')
+
+    if needs_detail_phase(vision_response):
+        add_detail_phase(client, 'vision', [(image, vision_response)])
+
+    with stage('vision', 'build'):
+        response_payload = build_analysis_payload(vision_response)
+
+    if cache_key:
+        VISION_RESULT_CACHE.set(cache_key, response_payload)
+    return response_payload, 200
+
+
+@app.route('/vision/analyze', methods=['POST'])
+def analyze_image_with_vision():
+    """Analyze an image with Google Cloud Vision to surface AI authenticity cues."""
+    try:
+        client = get_vision_client()
+    except Exception as exc:  # pragma: no cover - defensive logging
+        print(f"Failed to initialise Vision client: {exc}")
+        return jsonify({'error': 'Failed to initialise Vision client.'}), 500
+
+    # Reject oversize bodies while they are still being received
+    request.max_content_length = MAX_REQUEST_BYTES
+
+    try:
+        with stage('vision', 'decode'):
+            image_bytes, image_url = read_image_request()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    response_payload, status = analyze_image_source(client, image_bytes, image_url)
+    response = jsonify(response_payload)
+    if 'retryAfter' in response_payload:
+        response.headers['Retry-After'] = str(response_payload['retryAfter'])
+    return response, status
+
+
+def read_image_request() -> Tuple[Optional[bytes], Optional[str]]:
+    """Read one image from an upload or JSON body, raising ValueError for the client."""
+    if 'image' in request.files:
+        return resolve_image_source(read_uploaded_image(request.files['image']), None, None)
+    payload = request.get_json(silent=True) or {}
+    base64_payload = payload.get('imageBase64') or payload.get('image_base64')
+    image_url = payload.get('imageUrl') or payload.get('image_url')
+    return resolve_image_source(None, base64_payload, image_url)
+
+
+def analyze_image_source(client, image_bytes: Optional[bytes], image_url: Optional[str]) -> Tuple[dict, int]:
+    """Analyze one image, going through the result cache, near-duplicates and single-flight."""
+    cache_key = build_image_cache_key(image_bytes, image_url)
+    if cache_key:
+        cached_payload = VISION_RESULT_CACHE.get(cache_key)
+        if cached_payload is not None:
+            return cached_payload, 200
+
+    if not cache_key:
+        return analyze_image(client, image_bytes, image_url, None)
+
+    image_hash, cached_payload = near_duplicate_analysis(image_bytes, cache_key)
+    if cached_payload is not None:
+        return cached_payload, 200
+
+    # Concurrent requests for the same image share one Vision call. Workers in
+    # other processes re-check the cache once the one ahead of them finishes.
+    response_payload, status = VISION_FLIGHTS.do(
+        cache_key,
+        lambda: analyze_image(client, image_bytes, image_url, cache_key),
+        recheck=lambda: cached_analysis(cache_key),
+    )
+    if image_hash is not None and status == 200:
+        NEAR_DUPLICATES.add(image_hash, cache_key)
+    return response_payload, status
+
+
+def run_analysis_job(job: dict) -> Tuple[dict, int]:
+    try:
+        client = get_vision_client()
+    except Exception as exc:  # pragma: no cover - defensive logging
+        print(f"Failed to initialise Vision client: {exc}")
+        return {'error': 'Failed to initialise Vision client.'}, 500
+    with stage('vision_job', 'analyze'):
+        return analyze_image_source(client, job['image_bytes'], job['image_url'])
+
+
+# Queued analyses. With VISION_JOBS_PATH set (gunicorn.conf.py defaults it to
+# data/vision-jobs.db) jobs survive restarts and can be polled from any gunicorn
+# worker. Without it, as under `python app.py`, the queue is in memory and
+# private to the process, so it holds far fewer images by default.
+# Callbacks only go to hosts that resolve to public addresses; set
+# VISION_CALLBACK_HOSTS to a comma-separated allow-list to use fixed (possibly
+# internal) receivers instead. Failed deliveries are retried
+# VISION_CALLBACK_ATTEMPTS times in all.
+VISION_JOBS = JobQueue(
+    run_analysis_job,
+    db_path=os.environ.get('VISION_JOBS_PATH'),
+    workers=int(os.environ.get('VISION_JOB_WORKERS', 4)),
+    max_pending=int(os.environ.get('VISION_JOB_QUEUE_LIMIT', 256 if os.environ.get('VISION_JOBS_PATH') else 32)),
+    result_ttl=float(os.environ.get('VISION_JOB_TTL', 86400)),
+    callback_attempts=int(os.environ.get('VISION_CALLBACK_ATTEMPTS', 3)),
+    callback_hosts=os.environ.get('VISION_CALLBACK_HOSTS', '').split(','),
+    name='vision-jobs',
+)
+
+
+@app.before_request
+def start_worker_pools():
+    # Threads and process pools do not survive a fork, so each gunicorn worker starts its own.
+    VISION_JOBS.ensure_started()
+    PARSE_POOL.ensure_started()
+
+
+@app.route('/vision/jobs', methods=['POST'])
+def submit_vision_job():
+    """Queue an image for analysis and return a job id to poll (or a callback to wait for)."""
+    request.max_content_length = MAX_REQUEST_BYTES
+    try:
+        with stage('vision_job', 'decode'):
+            image_bytes, image_url = read_image_request()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    if 'image' in request.files:
+        callback_url = request.form.get('callbackUrl') or request.form.get('callback_url')
+    else:
+        payload = request.get_json(silent=True) or {}
+        callback_url = payload.get('callbackUrl') or payload.get('callback_url')
+    if callback_url and not is_http_url(callback_url):
+        return jsonify({'error': 'callbackUrl must be an http(s) URL.'}), 400
+    if callback_url and VISION_JOBS.callback_refusal(callback_url):
+        return jsonify({'error': 'callbackUrl must point at a publicly reachable host.'}), 400
+
+    try:
+        job_id = VISION_JOBS.submit(image_bytes, image_url, callback_url or None)
+    except QueueFull:
+        response = jsonify({'error': 'Too many analyses are queued. Retry shortly.'})
+        response.headers['Retry-After'] = str(VISION_JOB_RETRY_AFTER)
+        return response, 429
+
+    status_url = f'/vision/jobs/{job_id}'
+    response = jsonify({'jobId': job_id, 'status': 'queued', 'statusUrl': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+
+@app.route('/vision/jobs/<job_id>', methods=['GET'])
+def get_vision_job(job_id):
+    """Report a queued analysis job, including its result once it has finished."""
+    job = VISION_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id.'}), 404
+    return jsonify(job)
+
+
+@app.route('/vision/analyze/batch', methods=['POST'])
+def analyze_images_batch():
+    """Analyze several images, sharing batch_annotate_images RPCs between them.
+
+    With ?stream=ndjson or ?stream=sse (or a matching Accept header) each
+    result is sent as soon as it is ready instead of in one JSON body.
+    """
+    try:
+        client = get_vision_client()
+    except Exception as exc:  # pragma: no cover - defensive logging
+        print(f"Failed to initialise Vision client: {exc}")
+        return jsonify({'error': 'Failed to initialise Vision client.'}), 500
+
+    request.max_content_length = VISION_BATCH_MAX_BYTES
+
+    sources: List[Tuple[Optional[bytes], Optional[str], Optional[str]]] = []
+    upload_errors: Dict[int, str] = {}
+    if request.files:
+        for uploaded in request.files.getlist('images') + request.files.getlist('image'):
+            try:
+                sources.append((read_uploaded_image(uploaded), None, None))
+            except ValueError as exc:
+                upload_errors[len(sources)] = str(exc)
+                sources.append((None, None, None))
+    else:
+        payload = request.get_json(silent=True) or {}
+        items = payload.get('images')
+        if not isinstance(items, list):
+            return jsonify({'error': 'Provide an "images" list for batch analysis.'}), 400
+        for item in items:
+            if isinstance(item, str):
+                if item.startswith(('http://', 'https://', 'gs://')):
+                    sources.append((None, None, item))
+                else:
+                    sources.append((None, item, None))
+            elif isinstance(item, dict):
+                sources.append((
+                    None,
+                    item.get('imageBase64') or item.get('image_base64'),
+                    item.get('imageUrl') or item.get('image_url'),
+                ))
+            else:
+                sources.append((None, None, None))
+
+    if not sources:
+        return jsonify({'error': 'No images were provided for batch analysis.'}), 400
+    if len(sources) > VISION_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch analysis accepts at most {VISION_BATCH_MAX_ITEMS} images per request.'}), 400
+
+    analysis = analyze_batch_sources(client, sources, upload_errors)
+    mode = stream_mode()
+    if mode:
+        # Cached images and invalid items are sent at once, the rest as each Vision chunk returns.
+        return stream_response((('result', item) for item in analysis), mode)
+    results = sorted(analysis, key=lambda item: item['index'])
+    return jsonify({'count': len(results), 'results': results})
+
+
+def vision_batch_chunks(images: Dict[str, 'vision.Image']) -> Iterator[List[str]]:
+    """Group image keys into batch_annotate_images calls, by count and by request size."""
+    chunk: List[str] = []
+    chunk_bytes = 0
+    for key, image in images.items():
+        size = type(image).pb(image).ByteSize()
+        if chunk and (len(chunk) >= VISION_BATCH_SIZE or chunk_bytes + size > VISION_BATCH_REQUEST_BYTES):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(key)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def analyze_batch_sources(
+    client, sources: List[Tuple[Optional[bytes], Optional[str], Optional[str]]], upload_errors: Dict[int, str],
+) -> Iterator[dict]:
+    """Yield one result per source as soon as it is known, sharing batch_annotate_images RPCs between them."""
+    from google.api_core.exceptions import GoogleAPICallError, RetryError
+
+    # Identical images inside one batch share a single Vision request.
+    pending: Dict[str, List[int]] = {}
+    pending_images: Dict[str, 'vision.Image'] = {}
+    pending_hashes: Dict[str, int] = {}
+
+    for index, (image_bytes, base64_payload, image_url) in enumerate(sources):
+        if index in upload_errors:
+            yield {'index': index, 'status': 400, 'error': upload_errors[index]}
+            continue
+        try:
+            image_bytes, image_url = resolve_image_source(image_bytes, base64_payload, image_url)
+        except ValueError as exc:
+            yield {'index': index, 'status': 400, 'error': str(exc)}
+            continue
+
+        cache_key = build_image_cache_key(image_bytes, image_url)
+        if cache_key:
+            cached_payload = VISION_RESULT_CACHE.get(cache_key)
+            if cached_payload is not None:
+                yield {'index': index, 'status': 200, 'result': cached_payload}
+                continue
+            if cache_key not in pending:
+                image_hash, cached_payload = near_duplicate_analysis(image_bytes, cache_key)
+                if cached_payload is not None:
+                    yield {'index': index, 'status': 200, 'result': cached_payload}
+                    continue
+                if image_hash is not None:
+                    pending_hashes[cache_key] = image_hash
+
+        pending_key = cache_key or f'item:{index}'
+        if pending_key not in pending:
+            pending[pending_key] = []
+            pending_images[pending_key] = build_vision_image(image_bytes, image_url)
+        pending[pending_key].append(index)
+
+    features = build_vision_features(0)
+    for chunk in vision_batch_chunks(pending_images):
+        annotate_requests = [{'image': pending_images[key], 'features': features} for key in chunk]
+        chunk_results: Dict[str, dict] = {}
+
+        try:
+            with stage('vision_batch', 'rpc'):
+                batch_response = VISION_GUARD.call(client.batch_annotate_images, requests=annotate_requests)
+        except CircuitOpen as exc:
+            for key in chunk:
+                chunk_results[key] = {'status': 503, **vision_unavailable(exc)}
+        except (GoogleAPICallError, RetryError) as api_error:
+            record_upstream('vision', getattr(api_error, 'code', None) or 'error')
+            print(f"Vision batch API call failed: {api_error}")
+            for key in chunk:
+                chunk_results[key] = {'status': 502, 'error': 'Vision API request failed.', 'details': str(api_error)}
+        except Exception as exc:  # pragma: no cover - defensive logging
+            record_upstream('vision', 'error')
+            print(f"Unexpected Vision batch API error: {exc}")
+            for key in chunk:
+                chunk_results[key] = {'status': 500, 'error': 'Unexpected error while calling Vision API.'}
+        else:
+            responses = dict(zip(chunk, batch_response.responses))
+            add_detail_phase(client, 'vision_batch', [
+                (pending_images[key], vision_response)
+                for key, vision_response in responses.items() if needs_detail_phase(vision_response)
+            ])
+            for key, vision_response in responses.items():
+                if vision_response.error.message:
+                    record_upstream('vision', 'response_error')
+                    chunk_results[key] = {
+                        'status': 502,
+                        'error': 'Vision API returned an error.',
+                        'details': vision_response.error.message,
+                    }
+                    continue
+                record_upstream('vision', 'ok')
+                with stage('vision_batch', 'build'):
+                    response_payload = build_analysis_payload(vision_response)
+                if not key.startswith('item:'):
+                    VISION_RESULT_CACHE.set(key, response_payload)
+                    if key in pending_hashes:
+                        NEAR_DUPLICATES.add(pending_hashes[key], key)
+                chunk_results[key] = {'status': 200, 'result': response_payload}
+
+        for key in chunk:
+            outcome = chunk_results.get(key) or {'status': 502, 'error': 'Vision API returned no result for this image.'}
+            for index in pending[key]:
+                yield {'index': index, **outcome}
+
+
+@app.errorhandler(413)
+def request_too_large(_error):
+    return jsonify({'error': 'The request body is too large.'}), 413
+
+
+@app.route('/vision/cache', methods=['GET'])
+def vision_cache_stats():
+    """Report hit/miss counters for the Vision result cache."""
+    return jsonify({**VISION_RESULT_CACHE.stats(), 'nearDuplicateHashes': len(NEAR_DUPLICATES)})
 
 @app.route('/health', methods=['GET'])
 def health_check():
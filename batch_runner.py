@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterator, Optional, Sequence, Set, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Upper bound on in-flight fetches per worker process, shared by every batch.
+BATCH_WORKERS = int(os.environ.get('SCRAPE_BATCH_WORKERS', 16))
+# Scrapes pass the politeness scheduler's per-host connection cap instead.
+DEFAULT_PER_HOST = 4
+HOST_RETRY_INTERVAL = 0.05
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+class HostLimiter:
+    """Counts work in flight per key (normally a hostname) across every batch in a process.
+
+    A key is forgotten as soon as nothing is in flight for it, so memory
+    follows the hosts being fetched right now rather than every host seen.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, limit: int) -> bool:
+        with self._lock:
+            count = self._in_flight.get(key, 0)
+            if count >= max(1, limit):
+                return False
+            self._in_flight[key] = count + 1
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            count = self._in_flight.get(key, 0) - 1
+            if count > 0:
+                self._in_flight[key] = count
+            else:
+                self._in_flight.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+
+HOST_LIMITER = HostLimiter()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS), thread_name_prefix='scrape-batch')
+                _executor_pid = pid
+    return _executor
+
+
+def run_as_completed(
+    items: Sequence[T],
+    worker: Callable[[T], R],
+    host_of: Callable[[T], str],
+    window: Optional[int] = None,
+    per_host: int = DEFAULT_PER_HOST,
+) -> Iterator[Tuple[int, T, R]]:
+    """Run ``worker`` over ``items`` concurrently, yielding ``(index, item, result)`` as each finishes.
+
+    At most ``window`` items from this call are in flight at once, so a large
+    batch cannot monopolise the shared pool. Items whose host already has
+    ``per_host`` items in flight, counting other batches in this process,
+    stay queued here rather than parking a pool thread.
+    """
+    executor = get_executor()
+    window = max(1, window or BATCH_WORKERS)
+
+    pending: Deque[Tuple[int, T]] = deque(enumerate(items))
+    in_flight: Dict[Future, Tuple[int, T]] = {}
+
+    while pending or in_flight:
+        deferred: Deque[Tuple[int, T]] = deque()
+        while pending and len(in_flight) < window:
+            index, item = pending.popleft()
+            host = host_of(item)
+            if not HOST_LIMITER.try_acquire(host, per_host):
+                deferred.append((index, item))
+                continue
+            future = executor.submit(worker, item)
+            future.add_done_callback(lambda _future, held=host: HOST_LIMITER.release(held))
+            in_flight[future] = (index, item)
+        deferred.extend(pending)
+        pending = deferred
+
+        if not in_flight:
+            # Every remaining host is saturated by other requests in this process.
+            time.sleep(HOST_RETRY_INTERVAL)
+            continue
+
+        done: Set[Future]
+        done, _ = wait(in_flight, timeout=HOST_RETRY_INTERVAL if pending else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, item = in_flight.pop(future)
+            yield index, item, future.result()
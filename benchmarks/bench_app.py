@@ -0,0 +1,66 @@
+"""WSGI entry point for load tests: app.py with a fake Vision client and stage timers.
+
+Every response carries a Server-Timing header with the time spent in each
+stage of the request, so the load generator can aggregate stage timings
+across gunicorn workers without any shared state.
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+import app as service
+import scraping
+from benchmarks.fake_vision import FakeVisionClient
+
+_stages = threading.local()
+
+
+def timed(stage, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings = getattr(_stages, 'timings', None)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+    return wrapper
+
+
+class TimedVisionClient(FakeVisionClient):
+    annotate_image = timed('rpc', FakeVisionClient.annotate_image)
+    batch_annotate_images = timed('rpc', FakeVisionClient.batch_annotate_images)
+
+
+VISION_STANDIN = TimedVisionClient(float(os.environ.get('BENCH_VISION_LATENCY_MS', 0)) / 1000)
+
+service.get_vision_client = lambda: VISION_STANDIN
+scraping.fetch_page = timed('fetch', scraping.fetch_page)
+scraping.parse_soup = timed('parse', scraping.parse_soup)
+scraping.extract_main_content = timed('extract', scraping.extract_main_content)
+scraping.extract_with_lxml = timed('extract', scraping.extract_with_lxml)
+service.resolve_image_source = timed('decode', service.resolve_image_source)
+service.prepare_for_vision = timed('preprocess', service.prepare_for_vision)
+service.dhash = timed('phash', service.dhash)
+service.evaluate_ai_signals = timed('score', service.evaluate_ai_signals)
+service.build_analysis_payload = timed('build', service.build_analysis_payload)
+
+app = service.app
+
+
+@app.before_request
+def start_stage_timer():
+    _stages.timings = {}
+
+
+@app.after_request
+def add_server_timing(response):
+    timings = getattr(_stages, 'timings', None) or {}
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in timings.items()
+        )
+    _stages.timings = None
+    return response
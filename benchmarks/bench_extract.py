@@ -0,0 +1,83 @@
+"""Compare the BeautifulSoup and lxml content extractors.
+
+Usage:
+    python -m benchmarks.bench_extract [--corpus DIR] [--repeat N]
+
+Reports parse+extract time per engine and how often each engine's output
+matches the BeautifulSoup path after the /scrape 10,000 character cut-off.
+"""
+import argparse
+import statistics
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import load_corpus, synthetic_corpus
+from extraction import extract_with_lxml
+from soup_extraction import extract_main_content
+
+MAX_CHARS = 10000
+
+
+def truncate(content):
+    return content[:MAX_CHARS] + '...' if len(content) > MAX_CHARS else content
+
+
+def run_bs4(body):
+    soup = BeautifulSoup(body, 'html.parser')
+    content = extract_main_content(soup, max_chars=MAX_CHARS)
+    title = soup.title.string if soup.title else None
+    return truncate(content), title
+
+
+def run_lxml(body):
+    content, title = extract_with_lxml(body, max_chars=MAX_CHARS)
+    return truncate(content), title
+
+
+def run_readability(body):
+    content, title = extract_with_lxml(body, max_chars=MAX_CHARS, readability=True)
+    return truncate(content), title
+
+
+ENGINES = (('bs4', run_bs4), ('lxml', run_lxml), ('readability', run_readability))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of saved .html pages (default: synthetic corpus)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes over the corpus per engine')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not pages:
+        parser.error('no .html files found in the corpus directory')
+    total_bytes = sum(len(body) for _, body in pages)
+    print(f'{len(pages)} pages, {total_bytes / 1e6:.1f} MB, {args.repeat} passes')
+
+    reference = {name: run_bs4(body) for name, body in pages}
+
+    print(f"{'engine':<12} {'ms/page':>9} {'p95 ms':>9} {'MB/s':>8} {'same content':>13} {'same title':>11}")
+    for engine, run in ENGINES:
+        timings = []
+        same_content = same_title = 0
+        for _ in range(args.repeat):
+            for name, body in pages:
+                started = time.perf_counter()
+                content, title = run(body)
+                timings.append(time.perf_counter() - started)
+        for name, body in pages:
+            content, title = run(body)
+            same_content += content == reference[name][0]
+            same_title += (title or None) == (reference[name][1] or None)
+        mean_ms = statistics.mean(timings) * 1000
+        p95_ms = sorted(timings)[int(len(timings) * 0.95) - 1] * 1000
+        throughput = total_bytes * args.repeat / sum(timings) / 1e6
+        print(
+            f'{engine:<12} {mean_ms:>9.2f} {p95_ms:>9.2f} {throughput:>8.1f} '
+            f'{same_content:>6}/{len(pages):<6} {same_title:>5}/{len(pages):<5}'
+        )
+
+
+if __name__ == '__main__':
+    main()
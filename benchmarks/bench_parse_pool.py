@@ -0,0 +1,69 @@
+"""Measure how parse/extract throughput scales with the parse process pool.
+
+Usage:
+    python -m benchmarks.bench_parse_pool [--corpus DIR] [--threads N] [--processes 0,1,2,4]
+                                          [--extractor bs4|lxml|readability] [--pages N]
+
+Simulates one threaded gunicorn worker: --threads request threads each
+parse pages as fast as they can, either inline (0 processes, serialised by
+the GIL) or through a ParsePool with the given number of processes.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import load_corpus, synthetic_corpus
+from parse_pool import ParsePool, extract_document
+
+MAX_CHARS = 10000
+
+
+def run_layout(pages, threads, processes, extractor, total):
+    pool = ParsePool(processes, max_tasks_per_child=10 ** 6)
+    pool.ensure_started()
+    # Warm every process (imports, first-parse allocations) before timing.
+    for _, body in pages[:max(processes, 1) * 2]:
+        pool.run(extract_document, body, extractor, MAX_CHARS)
+
+    bodies = [pages[index % len(pages)][1] for index in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda body: pool.run(extract_document, body, extractor, MAX_CHARS), bodies))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of saved .html pages (default: synthetic corpus)')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--processes', default=None, help='comma-separated pool sizes; 0 means inline')
+    parser.add_argument('--extractor', default='bs4', choices=('bs4', 'lxml', 'readability'))
+    parser.add_argument('--pages', type=int, default=240, help='pages parsed per layout')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not pages:
+        parser.error('no .html files found in the corpus directory')
+    cpus = os.cpu_count() or 1
+    if args.processes:
+        layouts = [int(value) for value in args.processes.split(',')]
+    else:
+        layouts = sorted({0, 1, 2, cpus // 2, cpus})
+    print(f'{len(pages)} distinct pages, {args.pages} per layout, {args.threads} threads, '
+          f'{args.extractor} extractor, {cpus} CPUs')
+
+    print(f"{'processes':>9} {'pages/s':>9} {'ms/page':>9} {'speed-up':>9}")
+    baseline = None
+    for processes in layouts:
+        elapsed = run_layout(pages, args.threads, processes, args.extractor, args.pages)
+        rate = args.pages / elapsed
+        baseline = baseline or rate
+        label = 'inline' if processes == 0 else str(processes)
+        print(f'{label:>9} {rate:>9.1f} {elapsed / args.pages * 1000:>9.2f} {rate / baseline:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
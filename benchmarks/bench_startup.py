@@ -0,0 +1,98 @@
+"""Profile cold-start cost: module import time and time to the first response.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--top N] [--path /health]
+
+Each run starts a fresh interpreter with -X importtime, imports app.py and
+serves one request through the Flask test client. Reports the median wall
+time to that first response, the median import time of app.py, and the
+packages that cost the most to import (self time, summed per top-level
+package), flagging any that are meant to be loaded lazily.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use, so they should not show up for /health.
+LAZY_PACKAGES = ('google.cloud.vision', 'grpc', 'bs4', 'requests')
+
+FIRST_RESPONSE = (
+    'import time; started = time.perf_counter(); import app; '
+    'response = app.app.test_client().get({path!r}); '
+    'print(response.status_code, time.perf_counter() - started)'
+)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every line of an -X importtime report."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|', 1).split('|'))
+        modules.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def run_once(path: str) -> Tuple[float, int, List[Tuple[str, int, int]]]:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', FIRST_RESPONSE.format(path=path)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+    status = int(result.stdout.split()[-2])
+    return wall, status, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to start')
+    parser.add_argument('--top', type=int, default=15, help='packages to list')
+    parser.add_argument('--path', default='/health', help='path of the first request')
+    args = parser.parse_args()
+
+    walls: List[float] = []
+    app_import: List[int] = []
+    package_self: Dict[str, List[int]] = defaultdict(list)
+    loaded = set()
+    status = None
+    for _ in range(args.runs):
+        wall, status, modules = run_once(args.path)
+        walls.append(wall)
+        totals: Dict[str, int] = defaultdict(int)
+        for name, self_us, cumulative_us in modules:
+            totals[name.split('.')[0]] += self_us
+            loaded.add(name)
+            if name == 'app':
+                app_import.append(cumulative_us)
+        for package, self_us in totals.items():
+            package_self[package].append(self_us)
+
+    print(f'{args.runs} cold starts, first request GET {args.path} -> {status}')
+    print(f'time to first response (incl. interpreter start): {statistics.median(walls) * 1000:8.1f} ms')
+    print(f'import app:                                        {statistics.median(app_import) / 1000:8.1f} ms')
+    print()
+    print(f"{'package':<28} {'import ms':>10}")
+    ranked = sorted(package_self.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for package, samples in ranked[:args.top]:
+        print(f'{package:<28} {statistics.median(samples) / 1000:>10.1f}')
+
+    eager = [package for package in LAZY_PACKAGES if package in loaded]
+    print()
+    if eager:
+        print('imported eagerly (expected lazy): ' + ', '.join(eager))
+    else:
+        print('lazy packages not imported: ' + ', '.join(LAZY_PACKAGES))
+
+
+if __name__ == '__main__':
+    main()
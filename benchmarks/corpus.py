@@ -0,0 +1,109 @@
+"""Page corpora for the benchmarks.
+
+Real pages saved with "Save page as... (HTML only)" can be dropped into a
+directory and loaded with load_corpus(). When no directory is given the
+benchmarks fall back to a deterministic synthetic corpus that mimics the
+layouts extract_main_content has to deal with. synthetic_images() does the
+same for uploads: real JPEG and PNG files, so decoding, downscaling and
+perceptual hashing all do their actual work.
+"""
+import io
+import os
+import random
+from typing import List, Tuple
+
+WORDS = (
+    'the minister said on tuesday that officials would review the report after '
+    'several agencies raised concerns about data quality, funding and oversight '
+    'while analysts warned markets could react sharply to any delay in the plan'
+).split()
+
+LAYOUTS = ('article', 'main', 'role-main', 'div-content', 'div-post', 'body-only', 'live-blog')
+
+
+def load_corpus(directory: str) -> List[Tuple[str, bytes]]:
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.html', '.htm')):
+            with open(os.path.join(directory, name), 'rb') as handle:
+                pages.append((name, handle.read()))
+    return pages
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    return '\n'.join(
+        '<p>' + ' '.join(_sentence(rng) for _ in range(rng.randint(2, 6))) + '</p>'
+        for _ in range(count)
+    )
+
+
+def synthetic_page(rng: random.Random, layout: str) -> bytes:
+    chrome_links = ''.join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    sidebar = ''.join(f'<div class="promo"><a href="/story/{i}">{_sentence(rng)}</a></div>' for i in range(15))
+    scripts = ''.join(
+        f'<script>window.__data{i} = {{"items": [{",".join(str(n) for n in range(200))}]}};</script>'
+        for i in range(6)
+    )
+    paragraph_count = 400 if layout == 'live-blog' else rng.randint(6, 30)
+    story = _paragraphs(rng, paragraph_count)
+
+    if layout == 'article':
+        body = f'<article><h1>{_sentence(rng)}</h1>{story}</article>'
+    elif layout == 'main':
+        body = f'<main><h1>{_sentence(rng)}</h1>{story}</main>'
+    elif layout == 'role-main':
+        body = f'<div role="main"><h1>{_sentence(rng)}</h1>{story}</div>'
+    elif layout == 'div-content':
+        body = f'<div class="wrapper content"><h1>{_sentence(rng)}</h1>{story}</div>'
+    elif layout == 'div-post':
+        body = f'<div class="post entry"><h1>{_sentence(rng)}</h1>{story}</div>'
+    elif layout == 'live-blog':
+        updates = ''.join(
+            f'<div class="update"><time>{i:02d}:00</time>{_paragraphs(rng, 1)}</div>' for i in range(200)
+        )
+        body = f'<article><h1>Live: {_sentence(rng)}</h1>{story}{updates}</article>'
+    else:
+        body = f'<div class="wrapper"><h1>{_sentence(rng)}</h1>{story}</div>'
+
+    html = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>{_sentence(rng)}</title><style>body {{ margin: 0 }}</style>{scripts}</head>'
+        f'<body><header><nav><ul>{chrome_links}</ul></nav></header>'
+        f'<!-- ad slot -->{body}<aside>{sidebar}</aside>'
+        '<form><input name="q"></form><footer>Copyright</footer></body></html>'
+    )
+    return html.encode('utf-8')
+
+
+def synthetic_image(rng: random.Random) -> bytes:
+    """A photo-sized JPEG or PNG: smooth random colour fields with fine noise on top."""
+    from PIL import Image
+
+    width, height = rng.randint(320, 3000), rng.randint(240, 2200)
+    coarse = Image.frombytes('RGB', (8, 6), rng.randbytes(8 * 6 * 3)).resize((width, height), Image.BICUBIC)
+    noise = Image.frombytes('RGB', (width // 4, height // 4), rng.randbytes((width // 4) * (height // 4) * 3))
+    image = Image.blend(coarse, noise.resize((width, height), Image.NEAREST), 0.15)
+    buffer = io.BytesIO()
+    if rng.random() < 0.75:
+        image.save(buffer, 'JPEG', quality=rng.randint(70, 95))
+    else:
+        image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def synthetic_images(count: int = 32, seed: int = 1234) -> List[bytes]:
+    rng = random.Random(seed)
+    return [synthetic_image(rng) for _ in range(count)]
+
+
+def synthetic_corpus(count: int = 60, seed: int = 1234) -> List[Tuple[str, bytes]]:
+    rng = random.Random(seed)
+    return [
+        (f'synthetic-{index:03d}-{LAYOUTS[index % len(LAYOUTS)]}.html', synthetic_page(rng, LAYOUTS[index % len(LAYOUTS)]))
+        for index in range(count)
+    ]
@@ -0,0 +1,61 @@
+"""Offline stand-in for vision.ImageAnnotatorClient returning canned responses."""
+import time
+
+from google.cloud import vision
+
+
+def canned_response() -> vision.AnnotateImageResponse:
+    response = vision.AnnotateImageResponse()
+    for description, score in (
+        ('Digital art', 0.91), ('Illustration', 0.84), ('Photograph', 0.42),
+        ('Sky', 0.88), ('Cloud', 0.81), ('Landscape', 0.77),
+    ):
+        response.label_annotations.append(vision.EntityAnnotation(description=description, score=score))
+    response.safe_search_annotation.adult = vision.Likelihood.VERY_UNLIKELY
+    response.safe_search_annotation.spoof = vision.Likelihood.POSSIBLE
+    response.web_detection.best_guess_labels.append(vision.WebDetection.WebLabel(label='fantasy landscape render'))
+    for url in (
+        'https://www.artstation.com/artwork/abc', 'https://news.example.com/story',
+        'https://lexica.art/prompt/123', 'https://blog.example.org/post',
+    ):
+        response.web_detection.pages_with_matching_images.append(vision.WebDetection.WebPage(url=url))
+    for score in (0.9, 0.8, 0.7):
+        response.localized_object_annotations.append(vision.LocalizedObjectAnnotation(name='Person', score=score))
+    return response
+
+
+# Response fields filled in for each requested feature; others stay empty.
+FEATURE_FIELDS = {
+    'LABEL_DETECTION': 'label_annotations',
+    'SAFE_SEARCH_DETECTION': 'safe_search_annotation',
+    'WEB_DETECTION': 'web_detection',
+    'OBJECT_LOCALIZATION': 'localized_object_annotations',
+}
+
+
+class FakeVisionClient:
+    """Returns the canned response, cut down to the requested features, after an optional simulated RPC delay."""
+
+    def __init__(self, latency_seconds: float = 0.0) -> None:
+        self.latency_seconds = latency_seconds
+        self._response = canned_response()
+
+    def annotate_image(self, request, **kwargs) -> vision.AnnotateImageResponse:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._respond(request)
+
+    def batch_annotate_images(self, requests=None, **kwargs) -> vision.BatchAnnotateImagesResponse:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return vision.BatchAnnotateImagesResponse(
+            responses=[self._respond(request) for request in (requests or [])]
+        )
+
+    def _respond(self, request) -> vision.AnnotateImageResponse:
+        response = vision.AnnotateImageResponse()
+        for feature in request['features']:
+            field = FEATURE_FIELDS.get(vision.Feature.Type(feature.type_).name)
+            if field:
+                setattr(response, field, getattr(self._response, field))
+        return response
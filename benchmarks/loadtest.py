@@ -0,0 +1,271 @@
+"""Offline load test for /scrape and /vision/analyze.
+
+Usage:
+    python -m benchmarks.loadtest [--configs 1x1,2x4] [--scenario mixed]
+                                  [--requests 400] [--concurrency 16]
+                                  [--corpus DIR] [--json results.json]
+
+For every WORKERSxTHREADS configuration a gunicorn server is started on
+benchmarks.bench_app, which wraps app.py with a fake Vision client and stage
+timers. /scrape requests fetch pages from a local stand-in server replaying
+the corpus, so no network access or Google credentials are needed.
+
+Reported per configuration: requests/sec, p50/p95/p99 latency, mean time per
+stage (fetch, parse, extract, decode, rpc, score, build; 'build' includes
+'score') and peak RSS summed across the gunicorn master and workers.
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.corpus import load_corpus, synthetic_corpus, synthetic_images
+from benchmarks.standin import serve_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ('fetch', 'parse', 'extract', 'decode', 'preprocess', 'phash', 'rpc', 'score', 'build')
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """Sum VmRSS (bytes) of a process and its descendants using /proc."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as handle:
+                fields = handle.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status') as handle:
+                for line in handle:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.1) -> None:
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.startswith('dur='):
+            timings[name] = float(params[4:])
+    return timings
+
+
+def start_server(workers: int, threads: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--log-level', 'warning',
+        # Production settings, with the layout under test overriding workers and threads.
+        '--config', os.path.join(REPO_ROOT, 'gunicorn.conf.py'),
+        'benchmarks.bench_app:app',
+    ]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become healthy within 60s')
+
+
+def build_workload(scenario: str, page_urls: List[str], count: int, seed: int) -> List[Tuple[str, dict]]:
+    image_payloads = [base64.b64encode(image).decode() for image in synthetic_images(32, seed)] if scenario != 'scrape' else []
+    kinds = {'scrape': ['scrape'], 'vision': ['vision'], 'mixed': ['scrape', 'vision']}[scenario]
+    workload = []
+    for index, kind in zip(range(count), itertools.cycle(kinds)):
+        if kind == 'scrape':
+            workload.append(('/scrape', {'url': page_urls[index % len(page_urls)]}))
+        else:
+            workload.append(('/vision/analyze', {'imageBase64': image_payloads[index % len(image_payloads)]}))
+    return workload
+
+
+def run_load(base_url: str, workload: List[Tuple[str, dict]], concurrency: int) -> dict:
+    local = threading.local()
+    latencies: List[float] = []
+    stage_totals: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+
+    def send(item: Tuple[str, dict]) -> None:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, body = item
+        started = time.perf_counter()
+        try:
+            response = session.post(base_url + path, json=body, timeout=30)
+            status = response.status_code
+            timings = parse_server_timing(response.headers.get('Server-Timing'))
+        except requests.RequestException:
+            status, timings = 0, {}
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            for stage, duration in timings.items():
+                stage_totals.setdefault(stage, []).append(duration)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, workload))
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': len(workload),
+        'seconds': round(wall, 3),
+        'rps': round(len(workload) / wall, 1) if wall else 0.0,
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'stageMeanMs': {
+            stage: round(sum(values) / len(values), 3)
+            for stage, values in stage_totals.items() if values
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='1x1,2x4', help='comma-separated WORKERSxTHREADS gunicorn layouts')
+    parser.add_argument('--scenario', choices=('scrape', 'vision', 'mixed'), default='mixed')
+    parser.add_argument('--requests', type=int, default=400, help='requests per configuration')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests before each run')
+    parser.add_argument('--concurrency', type=int, default=16, help='client-side concurrent requests')
+    parser.add_argument('--corpus', help='directory of saved .html pages (default: synthetic corpus)')
+    parser.add_argument('--vision-latency-ms', type=float, default=0.0, help='simulated Vision RPC latency')
+    parser.add_argument('--extractor', default=os.environ.get('SCRAPE_EXTRACTOR', 'bs4'),
+                        help='SCRAPE_EXTRACTOR value for the server under test')
+    parser.add_argument('--with-caches', action='store_true', help='keep result/validator caches enabled')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not pages:
+        parser.error('no .html files found in the corpus directory')
+    standin, standin_url = serve_corpus(pages)
+    page_urls = [f'{standin_url}/pages/{name}' for name, _ in pages]
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = REPO_ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env['BENCH_VISION_LATENCY_MS'] = str(args.vision_latency_ms)
+    env['SCRAPE_EXTRACTOR'] = args.extractor
+    env['FLASK_ENV'] = 'production'
+    env['GUNICORN_ACCESS_LOG'] = ''
+    # Every page comes from one stand-in host, which per-host politeness would throttle.
+    env['SCRAPE_HOST_RATE'] = '0'
+    env['SCRAPE_HOST_CONNECTIONS'] = '1024'
+    if not args.with_caches:
+        env['VISION_CACHE_SIZE'] = '0'
+        env.pop('VISION_CACHE_PATH', None)
+        env['VISION_PHASH_DISTANCE'] = '0'
+        env['SCRAPE_VALIDATOR_CACHE_SIZE'] = '0'
+        env.pop('SCRAPE_VALIDATOR_CACHE_PATH', None)
+        env['SCRAPE_CONTENT_STORE_MAX_BYTES'] = '0'
+        env.pop('SCRAPE_CONTENT_STORE_PATH', None)
+
+    results = []
+    for layout in args.configs.split(','):
+        workers, threads = (int(part) for part in layout.lower().split('x'))
+        port = free_port()
+        process = start_server(workers, threads, port, env)
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            run_load(base_url, build_workload(args.scenario, page_urls, args.warmup, args.seed + 1), args.concurrency)
+            sampler = RssSampler(process.pid)
+            sampler.start()
+            outcome = run_load(
+                base_url, build_workload(args.scenario, page_urls, args.requests, args.seed), args.concurrency,
+            )
+            outcome['peakRssMb'] = round(sampler.stop() / 1e6, 1)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        outcome.update({'workers': workers, 'threads': threads, 'scenario': args.scenario, 'extractor': args.extractor})
+        results.append(outcome)
+
+    standin.shutdown()
+
+    print(f"{'layout':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8}  stages (mean ms)")
+    for outcome in results:
+        stages = ' '.join(f'{stage}={value}' for stage, value in outcome['stageMeanMs'].items())
+        print(
+            f"{outcome['workers']}x{outcome['threads']:<6} {outcome['rps']:>8} {outcome['p50Ms']:>8} "
+            f"{outcome['p95Ms']:>8} {outcome['p99Ms']:>8} {outcome['peakRssMb']:>8}  {stages}"
+        )
+        if set(outcome['statuses']) - {'200'}:
+            print(f"         statuses: {outcome['statuses']}")
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""Run the scraping or image pipeline over a file of URLs or images, offline.
+
+Usage:
+    python bulk.py scrape INPUT -o OUTPUT [--field url] [--concurrency 16] [--resume]
+    python bulk.py images INPUT -o OUTPUT [--field image] [--concurrency 8] [--resume]
+
+INPUT is JSONL (one object, or one bare string, per line) or CSV with a
+header row; '-' reads JSONL from stdin. It is streamed, never loaded whole.
+For images, a value starting with http:// or https:// is analysed by URL and
+anything else is read as a local file path. An "id" column or key, if present,
+is copied to the output so results can be joined back.
+
+OUTPUT is a JSONL file, or a directory of Parquet parts with --format parquet
+(needs pyarrow). Results are written as items finish, in completion order,
+each tagged with the input "index".
+
+Input is processed --chunk-size records at a time. After every chunk the
+output is flushed and OUTPUT.checkpoint.json records how far it got, so
+--resume after an interruption skips finished records and drops any output
+written past the checkpoint.
+
+Transient failures (timeouts, 429 throttling, 502/503/504) are retried up to
+--retries times, after any Retry-After the failure carried, before their chunk
+is checkpointed; only the final outcome is written. Scrapes also wait up to
+--host-wait seconds for a host's rate limit or Crawl-delay rather than
+failing fast as the web service does.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import batch_runner
+
+# (index, record): a dict, a bare string, or a ValueError for a line that is not JSON.
+Record = Tuple[int, Any]
+Result = Dict[str, Any]
+
+# Statuses worth another attempt: timeouts, throttling and upstream outages.
+RETRYABLE_STATUSES = frozenset({408, 429, 502, 503, 504})
+MAX_RETRY_DELAY = 300
+
+PARQUET_COLUMNS = {
+    'scrape': (('url', 'string'), ('title', 'string'), ('content', 'string')),
+    'images': (('image', 'string'), ('aiScore', 'int32'), ('verdict', 'string'), ('confidence', 'int32'), ('result', 'string')),
+}
+
+
+def read_records(path: str, input_format: str) -> Iterator[Record]:
+    """Yield numbered input records without reading the whole file."""
+    handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    with handle:
+        if input_format == 'csv':
+            for index, row in enumerate(csv.DictReader(handle)):
+                yield index, row
+            return
+        index = 0
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                record = ValueError(f'Invalid JSON: {exc}')
+            yield index, record
+            index += 1
+
+
+def field_value(record: Any, field: str) -> Optional[str]:
+    value = record.get(field) if isinstance(record, dict) else record
+    return value.strip() if isinstance(value, str) else None
+
+
+def record_id(record: Any) -> Optional[str]:
+    value = record.get('id') if isinstance(record, dict) else None
+    return None if value is None else str(value)
+
+
+class Checkpoint:
+    """Progress of one run: records finished and the output size at that point."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: dict) -> None:
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(state, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class JsonlWriter:
+    def __init__(self, path: str, offset: int) -> None:
+        self.handle = open(path, 'ab')
+        # Anything past the checkpoint belongs to a chunk that will be redone.
+        self.handle.truncate(offset)
+        self.handle.seek(offset)
+
+    def write(self, result: Result) -> None:
+        self.handle.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def commit(self, chunk: int) -> int:
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        return self.handle.tell()
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+class ParquetWriter:
+    """Writes each chunk as OUTPUT/part-NNNNN.parquet, so a redone chunk overwrites its own part."""
+
+    def __init__(self, directory: str, mode: str, fresh: bool) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.directory = directory
+        self.columns = (
+            ('index', 'int64'), ('id', 'string'), ('status', 'int32'),
+            *PARQUET_COLUMNS[mode], ('error', 'string'),
+        )
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.columns])
+        self.rows: List[Result] = []
+        os.makedirs(directory, exist_ok=True)
+        if fresh:
+            for name in os.listdir(directory):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(directory, name))
+
+    def write(self, result: Result) -> None:
+        row = {name: result.get(name) for name, _ in self.columns}
+        if 'result' in row and result.get('status') == 200:
+            row['result'] = json.dumps({key: value for key, value in result.items() if key not in row})
+        self.rows.append(row)
+
+    def commit(self, chunk: int) -> int:
+        if self.rows:
+            table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
+            self.pq.write_table(table, os.path.join(self.directory, f'part-{chunk:05d}.parquet'))
+            self.rows = []
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+def scrape_chunk(scraper, field: str, concurrency: int, records: List[Record]) -> Iterator[Result]:
+    urls = [field_value(record, field) for _, record in records]
+    for position, url, payload, status in scraper.scrape_many(urls, window=concurrency, chunk_size=len(urls)):
+        index, record = records[position]
+        if isinstance(record, ValueError):
+            payload, status = {'error': str(record)}, 400
+        yield {'index': index, 'id': record_id(record), 'url': url, 'status': status, **payload}
+
+
+def make_image_worker(field: str) -> Callable[[Record], Result]:
+    import app as service
+    from image_preprocess import PayloadTooLarge, read_upload
+
+    client = service.get_vision_client()
+
+    def analyze(item: Record) -> Result:
+        index, record = item
+        value = field_value(record, field)
+        result: Result = {'index': index, 'id': record_id(record), 'image': value}
+        if isinstance(record, ValueError):
+            return dict(result, status=400, error=str(record))
+        if not value:
+            return dict(result, status=400, error=f'No "{field}" value in this record')
+        image_bytes, image_url = None, None
+        try:
+            if value.startswith(('http://', 'https://')):
+                image_url = value
+            else:
+                with open(value, 'rb') as handle:
+                    image_bytes = read_upload(handle, service.MAX_IMAGE_BYTES)
+            image_bytes, image_url = service.resolve_image_source(image_bytes, None, image_url)
+        except PayloadTooLarge:
+            return dict(result, status=413, error='The image exceeds the 8MB limit supported by Vision analysis.')
+        except OSError as exc:
+            return dict(result, status=404, error=f'Could not read image file: {exc.strerror or exc}')
+        except ValueError as exc:
+            return dict(result, status=400, error=str(exc))
+        payload, status = service.analyze_image_source(client, image_bytes, image_url)
+        return dict(result, status=status, **payload)
+
+    return analyze
+
+
+def image_chunk(executor: ThreadPoolExecutor, worker: Callable[[Record], Result], records: List[Record]) -> Iterator[Result]:
+    futures = [executor.submit(worker, item) for item in records]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def process_with_retries(process: Callable[[List[Record]], Iterator[Result]], records: List[Record], retries: int) -> Iterator[Result]:
+    """Yield one final result per record, re-running transient failures up to ``retries`` times."""
+    by_index = dict(records)
+    pending = records
+    for attempt in range(retries + 1):
+        retry: List[Record] = []
+        delay = 0.0
+        for result in process(pending):
+            if attempt < retries and result.get('status') in RETRYABLE_STATUSES:
+                retry.append((result['index'], by_index[result['index']]))
+                delay = max(delay, float(result.get('retryAfter') or 0))
+                continue
+            yield result
+        if not retry:
+            return
+        delay = min(MAX_RETRY_DELAY, max(delay, 2 ** attempt))
+        print(f"Retrying {len(retry)} transient failures in {delay:.0f}s", file=sys.stderr)
+        time.sleep(delay)
+        pending = retry
+
+
+def detect_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=('scrape', 'images'))
+    parser.add_argument('input', help='JSONL or CSV file, or - for JSONL on stdin')
+    parser.add_argument('-o', '--output', required=True, help='JSONL file, or directory with --format parquet')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl', help='output format')
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'), help='default: from the file extension')
+    parser.add_argument('--field', help='key or column holding the URL or image (default: url / image)')
+    parser.add_argument('--concurrency', type=int, default=None, help='items in flight (default: 16 scrapes, 8 images)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='records between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue from OUTPUT.checkpoint.json if present')
+    parser.add_argument('--retries', type=int, default=3, help='extra attempts for timeouts, 429s and 5xx outages (3)')
+    parser.add_argument('--host-wait', type=float, default=120, help="seconds a scrape may wait on a host's rate limit (120)")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or detect_format(args.input)
+    field = args.field if args.field is not None else ('url' if args.mode == 'scrape' else 'image')
+    concurrency = max(1, args.concurrency or (16 if args.mode == 'scrape' else 8))
+    chunk_size = max(1, args.chunk_size)
+
+    checkpoint = Checkpoint(args.output.rstrip('/\\') + '.checkpoint.json')
+    run = {'mode': args.mode, 'input': os.path.abspath(args.input), 'format': args.format, 'field': field}
+    state = checkpoint.load() if args.resume else None
+    if state is not None and state.get('run') != run:
+        parser.error(f'{checkpoint.path} belongs to a different run: {state.get("run")}')
+    if state is None:
+        checkpoint.clear()
+        state = {'run': run, 'records': 0, 'chunks': 0, 'outputBytes': 0, 'ok': 0, 'failed': 0}
+    elif args.input == '-':
+        parser.error('--resume needs a file input; stdin cannot be replayed')
+
+    if args.format == 'parquet':
+        try:
+            writer = ParquetWriter(args.output, args.mode, fresh=not state['records'])
+        except ImportError:
+            parser.error('--format parquet needs pyarrow (pip install pyarrow)')
+    else:
+        writer = JsonlWriter(args.output, state['outputBytes'])
+
+    executor = None
+    if args.mode == 'scrape':
+        import http_session
+        from scraping import Scraper
+
+        # The shared batch pool is sized for request threads; let this run use its own width.
+        batch_runner.BATCH_WORKERS = max(batch_runner.BATCH_WORKERS, concurrency)
+        # Nobody is waiting on a response here, so wait out Crawl-delay and Retry-After instead of failing.
+        http_session.POLITENESS.max_wait = max(http_session.POLITENESS.max_wait, args.host_wait)
+        process = partial(scrape_chunk, Scraper(), field, concurrency)
+    else:
+        try:
+            worker = make_image_worker(field)
+        except Exception as exc:
+            print(f"Failed to initialise Vision client: {exc}", file=sys.stderr)
+            return 1
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-images')
+        process = partial(image_chunk, executor, worker)
+
+    records = itertools.islice(read_records(args.input, input_format), state['records'], None)
+    if state['records']:
+        print(f"Resuming after {state['records']} records", file=sys.stderr)
+    started = time.perf_counter()
+    done_this_run = 0
+    try:
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            for result in process_with_retries(process, chunk, max(0, args.retries)):
+                writer.write(result)
+                state['ok' if result['status'] == 200 else 'failed'] += 1
+            state['outputBytes'] = writer.commit(state['chunks'])
+            state['chunks'] += 1
+            state['records'] += len(chunk)
+            checkpoint.save(state)
+            done_this_run += len(chunk)
+            rate = done_this_run / max(time.perf_counter() - started, 1e-9)
+            print(f"{state['records']} records ({state['ok']} ok, {state['failed']} failed), {rate:.1f}/s", file=sys.stderr)
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun with --resume to continue after record {state['records']}", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    print(f"Finished: {state['records']} records, {state['ok']} ok, {state['failed']} failed", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from metrics import record_cache_lookup
+
+# Query parameters that only track where a click came from.
+TRACKING_PARAMS = frozenset({
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref_src', 'ref_url', 'spm', 'cmpid', 'ocid', 'ncid', 'sr_share', 'smid', 'cid',
+})
+TRACKING_PREFIXES = ('utm_', 'hsa_', 'pk_', 'mtm_', 'vero_')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Preset dictionary for zlib. Articles are only a few KB after extraction, too
+# short for the compressor to learn much on its own, so it starts from common
+# English and news boilerplate. The most frequent strings go last, where
+# zlib can reach them with the shortest distances. Changing this text needs a
+# new FORMAT_VERSION, because stored bodies can only be inflated with the
+# dictionary they were deflated with.
+ZDICT = (
+    'Subscribe to our newsletter Sign up for Privacy Policy Terms of Service Cookie Policy '
+    'All rights reserved. Copyright Advertisement Related Articles Read more Share this article '
+    'Follow us on Facebook Twitter Instagram LinkedIn YouTube Click here to Learn more '
+    'Updated Published Reporting by Editing by according to the report, said in a statement '
+    'government President minister officials police people percent million billion year years '
+    'Monday Tuesday Wednesday Thursday Friday Saturday Sunday January February March April May June '
+    'July August September October November December however, although because during between '
+    'through against without including according about after before under where while which '
+    'there their would could should these those other first last also more most some such than '
+    'that this with from have been were will they what when into only over said says new not '
+    'and the of to in a is for on that it as was with by at be this are from or an has had '
+    ' the of and to in is that for it was on are as with his they at be this have from '
+).encode('utf-8')
+FORMAT_VERSION = b'\x01'
+
+
+def canonical_url(url: str, canonical_href: Optional[str] = None) -> str:
+    """Normalise a URL for use as a store key, preferring a page's rel=canonical link.
+
+    Lower-cases the scheme and host, drops default ports, fragments and
+    tracking parameters, and keeps the remaining query in its original order.
+    A canonical link to another host is ignored, since any page can claim to
+    be the canonical copy of any other.
+    """
+    if canonical_href:
+        try:
+            resolved = urljoin(url, canonical_href)
+            trusted = urlsplit(resolved).scheme in ('http', 'https') and same_site(url, resolved)
+        except ValueError:
+            # A malformed link on the page must not fail the page itself.
+            trusted = False
+        if trusted:
+            url = resolved
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f'{host}:{port}'
+
+    query = urlencode([
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    ])
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def same_site(url: str, other: str) -> bool:
+    """True when both URLs are on the same host, ignoring a leading "www."."""
+    def site(value: str) -> str:
+        try:
+            host = (urlsplit(value).hostname or '').lower()
+        except ValueError:
+            return ''
+        return host[4:] if host.startswith('www.') else host
+
+    return bool(site(url)) and site(url) == site(other)
+
+
+def compress_text(text: str, level: int = 6) -> bytes:
+    compressor = zlib.compressobj(level, zdict=ZDICT)
+    return FORMAT_VERSION + compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def decompress_text(data: bytes) -> str:
+    if data[:1] != FORMAT_VERSION:
+        raise ValueError('Unknown content store format')
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    return (decompressor.decompress(data[1:]) + decompressor.flush()).decode('utf-8')
+
+
+class ContentStore:
+    """Extracted page text keyed by canonical URL, deduplicated and zlib-compressed in SQLite.
+
+    Several URLs (the requested one, its rel=canonical target, syndicated
+    copies) can point at one body, which is stored once under its SHA-256.
+    URLs that were only named by a page, such as its canonical link, are
+    aliases: they never replace an entry for a URL that was fetched directly.
+    Entries older than ``ttl_seconds`` are misses so the page is re-scraped.
+    When compressed bodies grow past ``max_bytes``, the least recently read
+    URLs are dropped, together with any bodies no URL still points at.
+    Without ``db_path`` the store lives in memory and is private to each
+    worker process.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl_seconds: float = 6 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        compression_level: int = 6,
+        name: str = 'scrape-content',
+    ) -> None:
+        self.db_path = db_path or None
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max(0, max_bytes)
+        self.compression_level = compression_level
+        self.name = name
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self._writes_since_check = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, url: str) -> Optional[Dict[str, str]]:
+        """Return {'content', 'title'} for a fresh entry, refreshing its last-read time."""
+        if not self.enabled:
+            return None
+        key = canonical_url(url)
+        now = time.time()
+        row = None
+        try:
+            connection = self._connection()
+            with self._db_lock:
+                row = connection.execute(
+                    'SELECT u.title, b.data, u.stored_at, u.accessed_at FROM urls u '
+                    'JOIN bodies b ON b.hash = u.body_hash WHERE u.url = ?',
+                    (key,),
+                ).fetchone()
+                if row is not None and now - row[2] > self.ttl_seconds:
+                    row = None
+                if row is not None and now - row[3] > 60:
+                    # Coarse LRU clock: at most one write per entry per minute.
+                    with connection:
+                        connection.execute('UPDATE urls SET accessed_at = ? WHERE url = ?', (now, key))
+        except sqlite3.Error as exc:
+            print(f"{self.name} store read failed: {exc}")
+            row = None
+
+        record_cache_lookup(self.name, row is not None)
+        if row is None:
+            return None
+        title, data, _, _ = row
+        try:
+            return {'content': decompress_text(data), 'title': title}
+        except (ValueError, zlib.error) as exc:
+            print(f"{self.name} store entry for {key} is unreadable: {exc}")
+            return None
+
+    def put(self, urls: Iterable[str], content: str, title: Optional[str], aliases: Iterable[str] = ()) -> None:
+        """Store extracted text under every given URL (after canonicalisation).
+
+        ``urls`` were fetched and always take the new text. ``aliases`` are
+        only added where no directly fetched entry exists.
+        """
+        if not self.enabled:
+            return
+        keys = {canonical_url(url) for url in urls if url}
+        if not keys:
+            return
+        alias_keys = {canonical_url(url) for url in aliases if url} - keys
+        # str() detaches BeautifulSoup NavigableStrings, which SQLite cannot bind.
+        content = str(content)
+        title = str(title) if title is not None else None
+        body_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        now = time.time()
+        try:
+            connection = self._connection()
+            with self._db_lock:
+                with connection:
+                    evicted = self._write(connection, keys, alias_keys, body_hash, content, title, now)
+                if evicted:
+                    connection.execute('PRAGMA incremental_vacuum')
+        except sqlite3.Error as exc:
+            print(f"{self.name} store write failed: {exc}")
+
+    def _write(
+        self, connection: sqlite3.Connection, keys: Set[str], alias_keys: Set[str],
+        body_hash: str, content: str, title: Optional[str], now: float,
+    ) -> bool:
+        """Insert the body once and point every key at it, returning whether eviction ran."""
+        if connection.execute('SELECT 1 FROM bodies WHERE hash = ?', (body_hash,)).fetchone() is None:
+            data = compress_text(content, self.compression_level)
+            connection.execute('INSERT INTO bodies (hash, data, size) VALUES (?, ?, ?)', (body_hash, data, len(data)))
+        connection.executemany(
+            'INSERT OR REPLACE INTO urls (url, body_hash, title, stored_at, accessed_at, direct) VALUES (?, ?, ?, ?, ?, 1)',
+            [(key, body_hash, title, now, now) for key in keys],
+        )
+        connection.executemany(
+            'INSERT INTO urls (url, body_hash, title, stored_at, accessed_at, direct) VALUES (?, ?, ?, ?, ?, 0) '
+            'ON CONFLICT (url) DO UPDATE SET body_hash = excluded.body_hash, title = excluded.title, '
+            'stored_at = excluded.stored_at, accessed_at = excluded.accessed_at WHERE urls.direct = 0',
+            [(key, body_hash, title, now, now) for key in alias_keys],
+        )
+        self._writes_since_check += 1
+        if self._writes_since_check < 32:
+            return False
+        self._writes_since_check = 0
+        self._evict(connection, now)
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        connection = self._connection()
+        with self._db_lock:
+            urls = connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+            bodies, stored_bytes = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies').fetchone()
+        return {
+            'name': self.name,
+            'persistent': bool(self.db_path),
+            'urls': urls,
+            'bodies': bodies,
+            'bytes': stored_bytes,
+            'maxBytes': self.max_bytes,
+            'ttlSeconds': self.ttl_seconds,
+        }
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        """Trim to 90% of max_bytes; called inside a write transaction."""
+        connection.execute('DELETE FROM urls WHERE stored_at < ?', (now - self.ttl_seconds,))
+        connection.execute('DELETE FROM bodies WHERE hash NOT IN (SELECT body_hash FROM urls)')
+        (total,) = connection.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()
+        target = self.max_bytes * 0.9
+        while total > self.max_bytes:
+            oldest = connection.execute(
+                'SELECT u.url, b.size FROM urls u JOIN bodies b ON b.hash = u.body_hash '
+                'ORDER BY u.accessed_at LIMIT 256'
+            ).fetchall()
+            if not oldest:
+                break
+            victims = []
+            freed = 0
+            for url, size in oldest:
+                victims.append((url,))
+                # Shared bodies are overcounted here, which only makes the next pass smaller.
+                freed += size
+                if total - freed <= target:
+                    break
+            connection.executemany('DELETE FROM urls WHERE url = ?', victims)
+            connection.execute('DELETE FROM bodies WHERE hash NOT IN (SELECT body_hash FROM urls)')
+            (total,) = connection.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()
+
+    def _connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        # One connection per worker process, as in ResultCache.
+        if self._db is None or self._db_pid != pid:
+            with self._db_lock:
+                if self._db is None or self._db_pid != pid:
+                    if self.db_path:
+                        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                    connection = sqlite3.connect(self.db_path or ':memory:', timeout=5, check_same_thread=False)
+                    # Must be set before the first table exists; lets freed pages go back to the OS.
+                    connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                    if self.db_path:
+                        connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(
+                        'CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL)'
+                    )
+                    connection.execute(
+                        'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, body_hash TEXT NOT NULL, '
+                        'title TEXT, stored_at REAL NOT NULL, accessed_at REAL NOT NULL, direct INTEGER NOT NULL DEFAULT 1)'
+                    )
+                    columns = {row[1] for row in connection.execute('PRAGMA table_info(urls)')}
+                    if 'direct' not in columns:
+                        # Stores written before aliases existed; treat their entries as fetched.
+                        connection.execute('ALTER TABLE urls ADD COLUMN direct INTEGER NOT NULL DEFAULT 1')
+                    connection.execute('CREATE INDEX IF NOT EXISTS urls_accessed ON urls (accessed_at)')
+                    connection.execute('CREATE INDEX IF NOT EXISTS urls_body ON urls (body_hash)')
+                    connection.commit()
+                    self._db = connection
+                    self._db_pid = pid
+        return self._db
+
+
+# Extracted pages served without any network or parse work while fresh. Set
+# SCRAPE_CONTENT_STORE_PATH to keep them across restarts and share them between workers.
+CONTENT_STORE = ContentStore(
+    db_path=os.environ.get('SCRAPE_CONTENT_STORE_PATH'),
+    ttl_seconds=float(os.environ.get('SCRAPE_CONTENT_TTL', 6 * 3600)),
+    max_bytes=int(os.environ.get('SCRAPE_CONTENT_STORE_MAX_BYTES', 256 * 1024 * 1024)),
+)
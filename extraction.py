@@ -0,0 +1,201 @@
+import html
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+# 'bs4' keeps the original BeautifulSoup extractor, 'lxml' is the single-pass
+# equivalent and 'readability' additionally scores text density when none of
+# the preferred containers has enough text.
+EXTRACTOR = os.environ.get('SCRAPE_EXTRACTOR', 'bs4').strip().lower()
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+NON_CONTENT_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside', 'form')
+
+# Mirrors content_selectors in extract_main_content, in order of preference.
+CONTENT_SELECTORS: List[Tuple[str, str, str]] = [
+    ('tag', 'article', 'article'),
+    ('tag', 'main', 'main'),
+    ('attr', 'role', 'main'),
+    ('class', 'class', 'content'),
+    ('class', 'class', 'article'),
+    ('class', 'class', 'post'),
+    ('class', 'class', 'entry'),
+    ('attr', 'id', 'content'),
+    ('attr', 'id', 'main'),
+]
+
+SCORED_TAGS = ('p', 'pre', 'td')
+
+LINK_TAG_RE = re.compile(rb'<link\b[^>]*>', re.IGNORECASE)
+TAG_ATTR_RE = re.compile(rb'([\w-]+)\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+)')
+HEAD_END_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
+TITLE_RE = re.compile(rb'<title\b[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+
+
+def clean_text(text: str) -> str:
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def guess_encoding(body: bytes) -> Optional[str]:
+    # html.parser via BeautifulSoup assumes UTF-8 first; libxml2 would fall back
+    # to Latin-1 for undeclared pages, so pin UTF-8 whenever it decodes cleanly.
+    try:
+        body.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    return 'utf-8'
+
+
+def find_title(body: bytes) -> Optional[str]:
+    """Return the document <title> text without parsing the page, for early partial results."""
+    match = TITLE_RE.search(body, 0, 256 * 1024)
+    if not match:
+        return None
+    raw_title = match.group(1)
+    return clean_text(html.unescape(raw_title.decode(guess_encoding(raw_title) or 'latin-1'))) or None
+
+
+def find_canonical_link(body: bytes) -> Optional[str]:
+    """Return the href of <link rel="canonical"> from the document head, without parsing the page."""
+    head_end = HEAD_END_RE.search(body)
+    head = body[:head_end.start()] if head_end else body[:256 * 1024]
+    for tag in LINK_TAG_RE.findall(head):
+        attrs = {name.lower(): value.strip(b'"\'') for name, value in TAG_ATTR_RE.findall(tag)}
+        if b'canonical' in attrs.get(b'rel', b'').lower().split() and attrs.get(b'href'):
+            return html.unescape(attrs[b'href'].decode('utf-8', 'replace')).strip() or None
+    return None
+
+
+def parse_html(body: bytes) -> Optional[etree._Element]:
+    parser = etree.HTMLParser(encoding=guess_encoding(body), remove_comments=True, remove_pis=True)
+    try:
+        return etree.fromstring(body, parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def stripped_length_exceeds(element: etree._Element, limit: int) -> bool:
+    offset = 0
+    start = None
+    for string in element.itertext():
+        if string.strip():
+            if start is None:
+                start = offset + len(string) - len(string.lstrip())
+            if offset + len(string.rstrip()) - start > limit:
+                return True
+        offset += len(string)
+    return False
+
+
+def collect_text(element: etree._Element, max_chars: Optional[int] = None) -> str:
+    if max_chars is None:
+        return clean_text(''.join(element.itertext()))
+
+    pieces: List[str] = []
+    collected = 0
+    next_check = max_chars
+    for string in element.itertext():
+        pieces.append(string)
+        collected += len(string)
+        if collected > next_check:
+            text = clean_text(''.join(pieces))
+            if len(text) > max_chars:
+                return text
+            next_check = collected + max_chars
+    return clean_text(''.join(pieces))
+
+
+def first_selector_matches(root: etree._Element) -> Dict[int, etree._Element]:
+    """Find the first element (in document order) for every content selector in one walk."""
+    matches: Dict[int, etree._Element] = {}
+    remaining = len(CONTENT_SELECTORS)
+    for element in root.iter(tag=etree.Element):
+        tag = element.tag
+        classes = None
+        for index, (kind, key, value) in enumerate(CONTENT_SELECTORS):
+            if index in matches:
+                continue
+            if kind == 'tag':
+                matched = tag == value
+            elif kind == 'attr':
+                matched = element.get(key) == value
+            else:
+                if classes is None:
+                    classes = (element.get('class') or '').split()
+                matched = value in classes
+            if matched:
+                matches[index] = element
+                remaining -= 1
+        if not remaining:
+            break
+    return matches
+
+
+def densest_block(root: etree._Element) -> Optional[etree._Element]:
+    """Pick the container whose paragraphs carry the most prose, readability-style."""
+    scores: Dict[etree._Element, float] = {}
+    for paragraph in root.iter(*SCORED_TAGS):
+        text = clean_text(''.join(paragraph.itertext()))
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = paragraph.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + score
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + score / 2
+
+    best = None
+    best_score = 0.0
+    for candidate, score in scores.items():
+        text_length = len(clean_text(''.join(candidate.itertext())))
+        if not text_length:
+            continue
+        link_length = sum(len(clean_text(''.join(link.itertext()))) for link in candidate.iter('a'))
+        score *= 1 - min(1.0, link_length / text_length)
+        if score > best_score:
+            best, best_score = candidate, score
+    return best
+
+
+def extract_with_lxml(
+    body: bytes, max_chars: Optional[int] = None, readability: bool = False,
+) -> Tuple[str, Optional[str]]:
+    """Single-pass lxml counterpart of extract_main_content, returning (content, title)."""
+    root = parse_html(body)
+    if root is None:
+        return '', None
+
+    # Keep tail text, which BeautifulSoup's decompose() leaves in place.
+    etree.strip_elements(root, *NON_CONTENT_TAGS, with_tail=False)
+
+    title = None
+    for title_element in root.iter('title'):
+        if len(title_element) == 0 and title_element.text:
+            title = title_element.text
+        break
+
+    matches = first_selector_matches(root)
+    main_content = None
+    for index in range(len(CONTENT_SELECTORS)):
+        main_content = matches.get(index)
+        if main_content is not None and stripped_length_exceeds(main_content, 100):
+            break
+    else:
+        dense = densest_block(root) if readability else None
+        if dense is not None:
+            main_content = dense
+
+    # Fallback to body if no main content found
+    if main_content is None:
+        main_content = root.find('body')
+
+    if main_content is None:
+        return '', title
+
+    return collect_text(main_content, max_chars), title
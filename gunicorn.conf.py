@@ -0,0 +1,231 @@
+"""Production gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+Everything can be overridden from the environment:
+    PORT                    listen port (8080)
+    GUNICORN_WORKER_CLASS   gthread (default) or gevent, if installed (gevent turns preloading off)
+    WEB_CONCURRENCY         worker processes (default: one per CPU, at least 2)
+    GUNICORN_THREADS        threads per gthread worker (8); scrapes and Vision calls mostly wait on I/O
+    GUNICORN_TIMEOUT        seconds a silent worker may take before it is restarted (30)
+    GUNICORN_MAX_REQUESTS   requests before a worker is recycled (1000, 0 disables)
+    VISION_WARMUP           1 to load Vision and connect its gRPC channel as each worker starts
+    VISION_FEATURE_PROFILE  standard (default), full or two-phase; see app.py
+    VISION_JOBS_PATH        SQLite file for queued Vision jobs (data/vision-jobs.db next to this file)
+    VISION_CACHE_PATH       SQLite file for cached Vision results (data/vision-cache.db)
+    SCRAPE_CONTENT_STORE_PATH  SQLite file for extracted pages (data/content-store.db)
+"""
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+
+def _cpu_count():
+    try:
+        # Respects CPU pinning (taskset, cpusets), unlike os.cpu_count().
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - macOS and Windows
+        return os.cpu_count() or 1
+
+
+def _worker_class():
+    requested = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread').strip().lower()
+    if requested == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print('GUNICORN_WORKER_CLASS=gevent but gevent is not installed; using gthread')
+            return 'gthread'
+    return requested
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+worker_class = _worker_class()
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, _cpu_count())))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 256))
+
+# A scrape may spend up to 5 s waiting on the per-host rate limiter and 10 s
+# on the upstream request, and a Vision call can take as long. 30 s leaves room
+# for both before a stuck worker is killed. During restarts, in-flight
+# scrapes get the full 10 s fetch timeout plus parsing to finish.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 15))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to contain memory growth from parsers and caches.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# Import the app, signal keyword tables and parsers once in the master and
+# share them copy-on-write. Sockets, thread pools, SQLite connections and the
+# gRPC Vision channel are all created lazily per worker process, after the fork.
+# gevent patches sockets, ssl and threading only as each worker starts, so
+# anything imported before the fork would keep the blocking versions.
+preload_app = worker_class != 'gevent' and os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Set GUNICORN_ACCESS_LOG to an empty string to turn access logging off.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# Every worker writes its Prometheus samples here so /metrics can aggregate
+# them. This has to be set before prometheus_client is imported by the app.
+# Without PROMETHEUS_MULTIPROC_DIR a fresh directory is made for this master
+# and removed when it exits. A directory the operator names is never cleaned
+# here; stale samples in it are only reported by the self-check.
+_own_metrics_dir = not os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if _own_metrics_dir:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='veritas-prometheus-')
+_metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+os.makedirs(_metrics_dir, exist_ok=True)
+_stale_metrics = glob.glob(os.path.join(_metrics_dir, '*.db'))
+
+_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Queued Vision jobs have to outlive a restart and be visible to whichever
+# worker is polled, so they live in a file shared by all workers. An empty
+# VISION_JOBS_PATH keeps them in memory, which only works with one worker.
+os.environ.setdefault('VISION_JOBS_PATH', os.path.join(_data_dir, 'vision-jobs.db'))
+# max_requests recycles workers, which would empty in-memory caches every few
+# thousand requests; keep Vision results and extracted pages in shared files.
+# Set either variable to an empty string to keep that cache in memory.
+os.environ.setdefault('VISION_CACHE_PATH', os.path.join(_data_dir, 'vision-cache.db'))
+os.environ.setdefault('SCRAPE_CONTENT_STORE_PATH', os.path.join(_data_dir, 'content-store.db'))
+
+
+def google_credentials_problem():
+    """Why Vision calls will lack credentials, judged from files only.
+
+    google.auth.default() would also probe the GCE metadata server, which
+    takes seconds off Google Cloud and would delay every cold start.
+    """
+    path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if path:
+        return None if os.path.isfile(path) else f'GOOGLE_APPLICATION_CREDENTIALS={path} does not exist'
+    if os.name == 'nt':
+        gcloud_dir = os.path.join(os.environ.get('APPDATA', ''), 'gcloud')
+    else:
+        gcloud_dir = os.path.join(os.path.expanduser('~'), '.config', 'gcloud')
+    gcloud_dir = os.environ.get('CLOUDSDK_CONFIG', gcloud_dir)
+    if os.path.isfile(os.path.join(gcloud_dir, 'application_default_credentials.json')):
+        return None
+    return 'neither GOOGLE_APPLICATION_CREDENTIALS nor gcloud application-default credentials are set up'
+
+
+def self_check(cfg):
+    """Fail fast on configuration that would break every request; warn about the rest."""
+    import app as service
+    from content_store import CONTENT_STORE
+    from extraction import EXTRACTOR
+    from parse_pool import extract_document
+
+    problems = []
+    if EXTRACTOR not in ('bs4', 'lxml', 'readability'):
+        problems.append(f'SCRAPE_EXTRACTOR={EXTRACTOR!r} is not one of bs4, lxml, readability')
+    if service.VISION_FEATURE_PROFILE not in service.VISION_FEATURE_PROFILES:
+        profiles = ', '.join(service.VISION_FEATURE_PROFILES)
+        problems.append(f'VISION_FEATURE_PROFILE={service.VISION_FEATURE_PROFILE!r} is not one of {profiles}')
+    try:
+        content, _ = extract_document(b'<html><body><article><p>self check</p></article></body></html>', EXTRACTOR, 100)
+        if 'self check' not in content:
+            problems.append('the HTML extractor returned no text for a trivial page')
+    except Exception as exc:
+        problems.append(f'the HTML extractor failed: {exc}')
+
+    # Opening the SQLite-backed stores creates their files and checks the paths are writable.
+    for label, check in (
+        ('Vision result cache', service.VISION_RESULT_CACHE.stats),
+        ('Vision job queue', service.VISION_JOBS.stats),
+        ('scrape content store', CONTENT_STORE.stats),
+    ):
+        try:
+            check()
+        except Exception as exc:
+            problems.append(f'{label} is unusable: {exc}')
+    if cfg.workers > 1 and not service.VISION_JOBS.db_path:
+        problems.append(
+            f'VISION_JOBS_PATH is empty, so each of the {cfg.workers} workers would keep its own in-memory '
+            'job queue: polls routed to another worker return 404 and queued jobs are lost on restart'
+        )
+    if not os.access(_metrics_dir, os.W_OK):
+        problems.append(f'PROMETHEUS_MULTIPROC_DIR {_metrics_dir} is not writable')
+    elif _stale_metrics:
+        print(f'Self-check warning: {_metrics_dir} already holds metric files; '
+              'samples from a previous run will be added to this one until they are removed')
+
+    # Scraping works without Google credentials, so their absence is only a warning.
+    credentials_problem = google_credentials_problem()
+    if credentials_problem:
+        print(f'Self-check warning: {credentials_problem}; unless this runs on Google Cloud, /vision endpoints will fail')
+
+    if problems:
+        for problem in problems:
+            print(f'Self-check failed: {problem}', file=sys.stderr)
+        raise SystemExit(1)
+    # Report what gunicorn will run, which command-line flags may have changed.
+    if cfg.worker_class_str == 'gevent':
+        per_worker = f'{cfg.worker_connections} connections'
+    else:
+        per_worker = f'{cfg.threads} threads'
+    print(f"Self-check passed: {cfg.workers} {cfg.worker_class_str} workers x {per_worker} on {', '.join(cfg.bind)}")
+
+
+def run_in_child(check, *args):
+    """Run ``check`` in a forked process, so the master inherits none of its imports."""
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            check(*args)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit(1)
+
+
+def on_starting(server):
+    if os.environ.get('GUNICORN_SELF_CHECK', '1') == '0':
+        return
+    if server.cfg.worker_class_str == 'gevent':
+        # Importing the app here would hand unpatched modules to every gevent worker.
+        run_in_child(self_check, server.cfg)
+    else:
+        self_check(server.cfg)
+
+
+def post_worker_init(worker):
+    # Start the job threads and the parse pool before the first request arrives.
+    if worker.cfg.worker_class_str == 'gevent':
+        # Must run after gevent's monkey-patching and before any gRPC channel exists.
+        from grpc.experimental import gevent as grpc_gevent
+
+        grpc_gevent.init_gevent()
+
+    import app as service
+
+    service.VISION_JOBS.ensure_started()
+    service.PARSE_POOL.ensure_started()
+    # With VISION_WARMUP=1, import Vision and open its channel in the background too.
+    service.start_warm_up()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from metrics import record_upstream
+from politeness import PolitenessScheduler, RobotsCache, parse_host_rates
+from result_cache import ResultCache
+
+if TYPE_CHECKING:
+    # requests and urllib3 are imported by the first fetch, not at start-up.
+    import requests
+
+# Set headers to mimic a real browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+# Number of distinct hosts to keep pools for, and connections kept per host.
+POOL_HOSTS = int(os.environ.get('SCRAPE_POOL_HOSTS', 32))
+POOL_SIZE = int(os.environ.get('SCRAPE_POOL_SIZE', 10))
+RETRIES = int(os.environ.get('SCRAPE_RETRIES', 2))
+RETRY_BACKOFF = float(os.environ.get('SCRAPE_RETRY_BACKOFF', 0.3))
+
+# Pages are read at most this far; anything beyond is dropped before parsing.
+MAX_PAGE_BYTES = int(os.environ.get('SCRAPE_MAX_BYTES', 2 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'application/xml', 'text/xml', 'text/plain')
+
+# ETag/Last-Modified validators plus the extracted payload, keyed by URL.
+VALIDATOR_CACHE = ResultCache(
+    max_entries=int(os.environ.get('SCRAPE_VALIDATOR_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('SCRAPE_VALIDATOR_CACHE_TTL', 86400)),
+    db_path=os.environ.get('SCRAPE_VALIDATOR_CACHE_PATH'),
+    name='scrape-validators',
+)
+
+
+
+class UnsupportedContentType(Exception):
+    """Raised when a scraped URL does not serve an HTML document."""
+
+    def __init__(self, content_type: str) -> None:
+        super().__init__(content_type)
+        self.content_type = content_type
+
+
+# retries -> (pid, session); one per retry policy, rebuilt after a fork.
+_sessions: Dict[int, Tuple[int, 'requests.Session']] = {}
+_session_lock = threading.Lock()
+
+
+def build_session(retries: int = RETRIES) -> 'requests.Session':
+    """Create a keep-alive session with per-host connection pools and retries.
+
+    429 and 503 are not retried here: they go back to the politeness
+    scheduler, which backs off from the host instead of sleeping for
+    whatever Retry-After the server asks for inside a request thread.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(BROWSER_HEADERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+@lru_cache(maxsize=None)
+def _deadline_timeout_class() -> type:
+    from urllib3.util.timeout import Timeout
+
+    class DeadlineTimeout(Timeout):
+        """A timeout whose first attempt and every retry all end by one deadline."""
+
+        def __init__(self, seconds: float, deadline: float) -> None:
+            self.seconds = seconds
+            self.deadline = deadline
+            # Reused keep-alive connections skip the connect step, so cap each phase as well as the total.
+            left = min(seconds, max(0.001, deadline - time.monotonic()))
+            super().__init__(connect=left, read=left, total=left)
+
+        def clone(self) -> 'DeadlineTimeout':
+            # urllib3 clones the timeout for each attempt; the total shrinks to what is left.
+            return DeadlineTimeout(self.seconds, self.deadline)
+
+    return DeadlineTimeout
+
+
+def deadline_timeout(seconds: float, deadline: float):
+    """Timeout for ``session.get`` that bounds connecting, retries and reads to ``deadline``."""
+    return _deadline_timeout_class()(seconds, deadline)
+
+
+def get_http_session(retries: int = RETRIES) -> 'requests.Session':
+    """Return the session shared by every thread in this worker process."""
+    pid = os.getpid()
+    entry = _sessions.get(retries)
+    # Pooled sockets must not leak across a gunicorn fork.
+    if entry is None or entry[0] != pid:
+        with _session_lock:
+            entry = _sessions.get(retries)
+            if entry is None or entry[0] != pid:
+                entry = (pid, build_session(retries))
+                _sessions[retries] = entry
+    return entry[1]
+
+
+def get_robots_session() -> 'requests.Session':
+    """Session for robots.txt: one attempt only, since the page fetch retries the host anyway."""
+    return get_http_session(retries=0)
+
+
+# Per-host politeness shared by every scraping thread in this worker process.
+# SCRAPE_HOST_RATES overrides the rate for specific hosts, e.g. "example.com=0.5".
+POLITENESS = PolitenessScheduler(
+    rate=float(os.environ.get('SCRAPE_HOST_RATE', 2)),
+    burst=float(os.environ.get('SCRAPE_HOST_BURST', 5)),
+    max_connections=int(os.environ.get('SCRAPE_HOST_CONNECTIONS', 4)),
+    max_wait=float(os.environ.get('SCRAPE_HOST_MAX_WAIT', 5)),
+    cooldown=float(os.environ.get('SCRAPE_HOST_COOLDOWN', 30)),
+    host_rates=parse_host_rates(os.environ.get('SCRAPE_HOST_RATES', '')),
+    robots=RobotsCache(
+        get_robots_session,
+        user_agent=os.environ.get('SCRAPE_ROBOTS_AGENT', 'VeritasAI'),
+        ttl_seconds=float(os.environ.get('SCRAPE_ROBOTS_TTL', 3600)),
+        timeout=float(os.environ.get('SCRAPE_ROBOTS_TIMEOUT', 3)),
+        error_ttl_seconds=float(os.environ.get('SCRAPE_ROBOTS_ERROR_TTL', 60)),
+    ) if os.environ.get('SCRAPE_RESPECT_ROBOTS', '1') != '0' else None,
+)
+
+
+def fetch_page(url: str, cached: Optional[dict] = None, timeout: float = 10) -> Tuple['requests.Response', bytes]:
+    """Stream a page through the shared session, reading at most MAX_PAGE_BYTES.
+
+    Non-HTML responses are rejected from their headers before any of the body
+    is downloaded. A 304 for a cached URL is returned with an empty body.
+    The whole fetch, retries and body included, takes at most ``timeout``
+    seconds once POLITENESS grants a slot; past that it raises ReadTimeout.
+    Raises HostThrottled or BlockedByRobots when POLITENESS refuses the fetch.
+    """
+    import requests
+
+    headers = conditional_headers(cached)
+    with POLITENESS.slot(url):
+        deadline = time.monotonic() + timeout
+        with get_http_session().get(url, headers=headers, timeout=deadline_timeout(timeout, deadline), stream=True) as response:
+            record_upstream('scrape', response.status_code)
+            POLITENESS.observe(url, response)
+            if response.status_code == 304 and cached:
+                return response, b''
+            response.raise_for_status()
+
+            content_type = (response.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+            if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+                raise UnsupportedContentType(content_type)
+
+            chunks = []
+            remaining = MAX_PAGE_BYTES
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                # A server trickling bytes never trips the per-read timeout on its own.
+                if time.monotonic() > deadline:
+                    raise requests.exceptions.ReadTimeout(f'Reading {url} took longer than {timeout}s')
+                if not chunk:
+                    continue
+                chunks.append(chunk[:remaining])
+                remaining -= len(chunk)
+                if remaining <= 0:
+                    break
+    return response, b''.join(chunks)
+
+
+def conditional_headers(entry: Optional[dict]) -> Dict[str, str]:
+    if not entry:
+        return {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('lastModified'):
+        headers['If-Modified-Since'] = entry['lastModified']
+    return headers
+
+
+def remember_validators(url: str, response: 'requests.Response', payload: dict) -> None:
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not etag and not last_modified:
+        return
+    # Copy strings so cached BeautifulSoup NavigableStrings do not pin the whole parse tree.
+    detached = {key: str(value) if isinstance(value, str) else value for key, value in payload.items()}
+    VALIDATOR_CACHE.set(url, {'etag': etag, 'lastModified': last_modified, 'payload': detached})
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import io
+import os
+from typing import BinaryIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Longest edge sent to Vision. Labels, SafeSearch and web detection do not
+# benefit from more pixels than this, but RPC latency grows with payload size.
+MAX_EDGE = int(os.environ.get('VISION_MAX_EDGE', 1600))
+JPEG_QUALITY = int(os.environ.get('VISION_JPEG_QUALITY', 85))
+# Images already within MAX_EDGE are re-encoded only when larger than this.
+RECOMPRESS_BYTES = int(os.environ.get('VISION_RECOMPRESS_BYTES', 1024 * 1024))
+
+READ_CHUNK = 1024 * 1024
+# Multiple of 4 so every chunk decodes independently.
+BASE64_CHUNK = 4 * 256 * 1024
+
+# Refuse to decode pathological "decompression bomb" images.
+Image.MAX_IMAGE_PIXELS = int(os.environ.get('VISION_MAX_PIXELS', 64_000_000))
+
+
+class PayloadTooLarge(ValueError):
+    """Raised as soon as an image payload is known to exceed its size limit."""
+
+
+def read_upload(stream: BinaryIO, limit: int) -> bytes:
+    """Read an uploaded file, giving up as soon as it grows past ``limit`` bytes."""
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            return bytes(buffer)
+        buffer += chunk
+        if len(buffer) > limit:
+            raise PayloadTooLarge(f'Upload exceeds {limit} bytes.')
+
+
+def decode_base64(payload: str, limit: int) -> bytes:
+    """Strictly decode base64 chunk by chunk, rejecting oversize payloads before decoding.
+
+    Raises binascii.Error for malformed input, matching base64.b64decode(validate=True).
+    """
+    payload = payload.strip()
+    padding = len(payload) - len(payload.rstrip('='))
+    if len(payload) * 3 // 4 - padding > limit:
+        raise PayloadTooLarge(f'Decoded image exceeds {limit} bytes.')
+    if len(payload) % 4:
+        raise binascii.Error('Incorrect base64 padding')
+
+    decoded = bytearray()
+    last_chunk = len(payload) - BASE64_CHUNK
+    for offset in range(0, len(payload), BASE64_CHUNK):
+        chunk = payload[offset:offset + BASE64_CHUNK]
+        if offset < last_chunk and '=' in chunk:
+            raise binascii.Error('Padding found before the end of the payload')
+        decoded += base64.b64decode(chunk, validate=True)
+    return bytes(decoded)
+
+
+def prepare_for_vision(image_bytes: bytes) -> bytes:
+    """Downscale and re-encode an image for upload, falling back to the original bytes.
+
+    The image is decoded once. Images larger than MAX_EDGE are resized to fit,
+    and oversized files are re-encoded as JPEG (PNG when they have
+    transparency). The original bytes are kept whenever they are already small,
+    cannot be decoded here, or the re-encoded version would not be smaller.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        width, height = image.size
+        if max(width, height) <= MAX_EDGE and len(image_bytes) <= RECOMPRESS_BYTES:
+            return image_bytes
+
+        if image.format == 'JPEG':
+            # Let libjpeg decode at a reduced scale instead of full resolution.
+            image.draft('RGB', (MAX_EDGE, MAX_EDGE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_EDGE, MAX_EDGE), Image.Resampling.BICUBIC)
+
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image.save(output, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(output, format='JPEG', quality=JPEG_QUALITY)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as exc:
+        print(f"Image pre-processing skipped: {exc}")
+        return image_bytes
+
+    processed = output.getvalue()
+    return processed if len(processed) < len(image_bytes) else image_bytes
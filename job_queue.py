@@ -0,0 +1,313 @@
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from http_session import get_http_session
+from metrics import record_upstream
+
+# A job handler receives the stored job and returns (payload, HTTP status).
+JobHandler = Callable[[Dict[str, Any]], Tuple[dict, int]]
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its pending limit."""
+
+
+def callback_refusal(url: str, allowed_hosts: FrozenSet[str] = frozenset()) -> Optional[str]:
+    """Why ``url`` may not receive a job callback, or None when it may.
+
+    With ``allowed_hosts`` set, only those hosts are accepted (and may be
+    internal). Otherwise the host must resolve to public addresses only, so
+    callbacks cannot reach loopback, private networks or link-local services
+    such as cloud metadata endpoints.
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        return 'malformed URL'
+    if parts.scheme not in ('http', 'https') or not host:
+        return 'not an http(s) URL'
+    if allowed_hosts:
+        return None if host in allowed_hosts else f'{host} is not an allowed callback host'
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, UnicodeError):
+        return f'{host} does not resolve'
+    for raw_address in addresses:
+        address = ipaddress.ip_address(raw_address.split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return f'{host} resolves to non-public address {address}'
+    return None
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by a pool of worker threads in each process.
+
+    Jobs are claimed with a lease, so work held by a worker that died (or by a
+    previous deployment) is picked up again once the lease expires. With
+    ``db_path`` set, the queue survives restarts and is shared by every
+    gunicorn worker on the host; without it, each process keeps a private
+    in-memory queue.
+
+    A job's ``callback_url`` is POSTed the finished job, only if
+    ``callback_refusal`` accepts it and without following redirects. A
+    delivery that fails with a connection error, 429 or 5xx is retried up to
+    ``callback_attempts`` times in all, with exponential backoff from
+    ``callback_backoff`` seconds. Receivers may therefore see a job more than
+    once and should de-duplicate on ``jobId``.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        db_path: Optional[str] = None,
+        workers: int = 4,
+        max_pending: int = 256,
+        lease_seconds: float = 120,
+        max_attempts: int = 3,
+        result_ttl: float = 86400,
+        poll_interval: float = 0.5,
+        callback_timeout: float = 10,
+        callback_attempts: int = 3,
+        callback_backoff: float = 2.0,
+        callback_hosts: Iterable[str] = (),
+        name: str = 'jobs',
+    ) -> None:
+        self.handler = handler
+        self.db_path = db_path or None
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.callback_timeout = callback_timeout
+        self.callback_attempts = max(1, callback_attempts)
+        self.callback_backoff = callback_backoff
+        self.callback_hosts = frozenset(host.strip().lower() for host in callback_hosts if host.strip())
+        self.name = name
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._claims_since_prune = 0
+
+    def submit(self, image_bytes: Optional[bytes], image_url: Optional[str], callback_url: Optional[str] = None) -> str:
+        """Queue an analysis and return its job id, raising QueueFull when the queue is at its limit."""
+        self.ensure_started()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        connection = self._connection()
+        with self._db_lock, connection:
+            (pending,) = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+            if pending >= self.max_pending:
+                raise QueueFull(f'{pending} jobs are already pending.')
+            connection.execute(
+                'INSERT INTO jobs (id, status, image, image_url, callback_url, attempts, created_at, updated_at) '
+                "VALUES (?, 'queued', ?, ?, ?, 0, ?, ?)",
+                (job_id, image_bytes, image_url, callback_url, now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def callback_refusal(self, url: str) -> Optional[str]:
+        return callback_refusal(url, self.callback_hosts)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        connection = self._connection()
+        with self._db_lock:
+            row = connection.execute(
+                'SELECT status, status_code, result, created_at, updated_at, attempts FROM jobs WHERE id = ?',
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, status_code, raw_result, created_at, updated_at, attempts = row
+        job: Dict[str, Any] = {
+            'jobId': job_id,
+            'status': status,
+            'attempts': attempts,
+            'createdAt': created_at,
+            'updatedAt': updated_at,
+        }
+        if status_code is not None:
+            job['statusCode'] = status_code
+        if raw_result is not None:
+            job['result'] = json.loads(raw_result)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        connection = self._connection()
+        with self._db_lock:
+            counts = dict(connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {
+            'name': self.name,
+            'persistent': bool(self.db_path),
+            'workers': self.workers,
+            'maxPending': self.max_pending,
+            'counts': counts,
+        }
+
+    def ensure_started(self) -> None:
+        """Start this process's worker threads (again after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid or not self.workers:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            self._threads = [
+                threading.Thread(target=self._work, name=f'{self.name}-{index}', daemon=True)
+                for index in range(self.workers)
+            ]
+            self._pid = pid
+            for thread in self._threads:
+                thread.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        # Like ResultCache, every worker process opens its own connection.
+        if self._db is None or self._db_pid != pid:
+            with self._db_lock:
+                if self._db is None or self._db_pid != pid:
+                    path = self.db_path or ':memory:'
+                    if self.db_path:
+                        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                    connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+                    if self.db_path:
+                        connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(
+                        'CREATE TABLE IF NOT EXISTS jobs ('
+                        'id TEXT PRIMARY KEY, status TEXT NOT NULL, image BLOB, image_url TEXT, '
+                        'callback_url TEXT, result TEXT, status_code INTEGER, attempts INTEGER NOT NULL, '
+                        'created_at REAL NOT NULL, updated_at REAL NOT NULL, lease_expires REAL)'
+                    )
+                    connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+                    connection.commit()
+                    self._db = connection
+                    self._db_pid = pid
+        return self._db
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job, including ones whose lease ran out."""
+        connection = self._connection()
+        now = time.time()
+        with self._db_lock:
+            try:
+                # BEGIN IMMEDIATE stops two processes from claiming the same row.
+                connection.execute('BEGIN IMMEDIATE')
+                row = connection.execute(
+                    'SELECT id, image, image_url, callback_url, attempts FROM jobs '
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                    'ORDER BY created_at LIMIT 1',
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_expires = ?, "
+                        'updated_at = ? WHERE id = ?',
+                        (now + self.lease_seconds, now, row[0]),
+                    )
+                self._claims_since_prune += 1
+                if self._claims_since_prune >= 256 and self.result_ttl:
+                    self._claims_since_prune = 0
+                    connection.execute(
+                        "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                        (now - self.result_ttl,),
+                    )
+                connection.commit()
+            except sqlite3.Error:
+                connection.rollback()
+                raise
+        if row is None:
+            return None
+        job_id, image, image_url, callback_url, attempts = row
+        return {
+            'id': job_id,
+            'image_bytes': bytes(image) if image is not None else None,
+            'image_url': image_url,
+            'callback_url': callback_url,
+            'attempts': attempts + 1,
+        }
+
+    def _finish(self, job_id: str, payload: dict, status_code: int) -> None:
+        status = 'done' if status_code < 400 else 'failed'
+        connection = self._connection()
+        with self._db_lock, connection:
+            # The image is no longer needed once the job has a result.
+            connection.execute(
+                'UPDATE jobs SET status = ?, status_code = ?, result = ?, image = NULL, '
+                'lease_expires = NULL, updated_at = ? WHERE id = ?',
+                (status, status_code, json.dumps(payload), time.time(), job_id),
+            )
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as exc:
+                print(f"{self.name} queue claim failed: {exc}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            if job['attempts'] > self.max_attempts:
+                payload, status_code = {'error': 'Job was abandoned after repeated worker failures.'}, 500
+            else:
+                try:
+                    payload, status_code = self.handler(job)
+                except Exception as exc:  # pragma: no cover - defensive logging
+                    print(f"{self.name} job {job['id']} failed: {exc}")
+                    payload, status_code = {'error': 'Unexpected error while processing the job.'}, 500
+
+            try:
+                self._finish(job['id'], payload, status_code)
+            except sqlite3.Error as exc:
+                print(f"{self.name} queue update failed: {exc}")
+                continue
+            if job['callback_url']:
+                self._deliver_callback(job['callback_url'], job['id'])
+
+    def _deliver_callback(self, callback_url: str, job_id: str) -> None:
+        # Checked again at delivery, since the host's DNS may have changed since submission.
+        refusal = self.callback_refusal(callback_url)
+        if refusal:
+            record_upstream('callback', 'refused')
+            print(f"{self.name} callback to {callback_url} refused: {refusal}")
+            return
+        job = self.get(job_id)
+        for attempt in range(self.callback_attempts):
+            if attempt:
+                time.sleep(self.callback_backoff * 2 ** (attempt - 1))
+            try:
+                # A redirect could lead past the address check, so it is not followed.
+                response = get_http_session().post(
+                    callback_url, json=job, timeout=self.callback_timeout, allow_redirects=False,
+                )
+            except Exception as exc:
+                record_upstream('callback', 'error')
+                print(f"{self.name} callback to {callback_url} failed: {exc}")
+                continue
+            record_upstream('callback', response.status_code)
+            if response.status_code < 500 and response.status_code != 429:
+                return
+        print(f"{self.name} gave up on callback to {callback_url} after {self.callback_attempts} attempts")
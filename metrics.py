@@ -0,0 +1,147 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from flask import Flask, Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Latency buckets from 1 ms to the 10 s scrape timeout.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    'veritas_request_duration_seconds',
+    'End-to-end request latency by endpoint.',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    'veritas_requests_total',
+    'Responses sent, by endpoint and HTTP status.',
+    ['endpoint', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'veritas_requests_in_flight',
+    'Requests currently being handled.',
+    ['endpoint'],
+    multiprocess_mode='livesum',
+)
+STAGE_SECONDS = Histogram(
+    'veritas_stage_duration_seconds',
+    'Time spent in each processing stage. Stages can nest (extract includes clean, build includes score).',
+    ['endpoint', 'stage'],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter(
+    'veritas_upstream_responses_total',
+    'Responses (or failures) from upstream websites and the Vision API.',
+    ['upstream', 'status'],
+)
+CACHE_LOOKUPS = Counter(
+    'veritas_cache_lookups_total',
+    'Result cache lookups by cache and outcome.',
+    ['cache', 'result'],
+)
+
+COALESCED_CALLS = Counter(
+    'veritas_coalesced_calls_total',
+    'Calls that shared an in-flight upstream operation instead of starting their own.',
+    ['flight'],
+)
+CIRCUIT_OPEN = Gauge(
+    'veritas_circuit_open',
+    'Whether calls to an upstream are being short-circuited (1) in any live worker.',
+    ['circuit'],
+    multiprocess_mode='livemax',
+)
+
+# Cleared in parse-pool processes; see stop_recording().
+_recording = True
+
+
+def stop_recording() -> None:
+    """Drop stage timings taken in this process.
+
+    Used in parse-pool processes, whose samples nothing would collect without
+    PROMETHEUS_MULTIPROC_DIR, and which would each leave a metrics file behind
+    with it. The calling worker times the whole pool call instead.
+    """
+    global _recording
+    _recording = False
+
+
+@contextmanager
+def stage(endpoint: str, name: str) -> Iterator[None]:
+    if not _recording:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(endpoint, name).observe(time.perf_counter() - started)
+
+
+def record_upstream(upstream: str, status) -> None:
+    UPSTREAM_RESPONSES.labels(upstream, str(status)).inc()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_coalesced(flight: str) -> None:
+    COALESCED_CALLS.labels(flight).inc()
+
+
+def set_circuit_open(circuit: str, is_open: bool) -> None:
+    CIRCUIT_OPEN.labels(circuit).set(1 if is_open else 0)
+
+
+def _endpoint_name() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def render_metrics() -> Response:
+    # With PROMETHEUS_MULTIPROC_DIR set every gunicorn worker writes its samples
+    # to that directory and any worker can serve the aggregated view.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app: Flask) -> None:
+    """Register request instrumentation and the /metrics endpoint on a Flask app."""
+
+    @app.before_request
+    def start_request_metrics() -> None:
+        endpoint = _endpoint_name()
+        if endpoint == '/metrics':
+            return
+        g.metrics_endpoint = endpoint
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.labels(endpoint).inc()
+
+    @app.after_request
+    def count_response(response: Response) -> Response:
+        endpoint: Optional[str] = g.get('metrics_endpoint')
+        if endpoint:
+            REQUESTS_TOTAL.labels(endpoint, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(_exc: Optional[BaseException]) -> None:
+        endpoint: Optional[str] = g.get('metrics_endpoint')
+        if not endpoint:
+            return
+        # Streamed responses reach teardown only after the last chunk is sent.
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.metrics_started)
+        IN_FLIGHT.labels(endpoint).dec()
+        g.metrics_endpoint = None
+
+    app.add_url_rule('/metrics', 'metrics', render_metrics, methods=['GET'])
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple, TypeVar
+
+from extraction import extract_with_lxml
+from metrics import stop_recording
+from soup_extraction import extract_with_bs4
+
+R = TypeVar('R')
+
+# Processes per gunicorn worker for parse/extract; 0 keeps it in the request thread.
+PARSE_PROCESSES = int(os.environ.get('SCRAPE_PARSE_PROCESSES', 0))
+# Recycle a process after this many pages to contain parser memory growth.
+PARSE_MAX_TASKS = int(os.environ.get('SCRAPE_PARSE_MAX_TASKS', 200))
+
+# ProcessPoolExecutor(max_tasks_per_child=...) needs Python 3.11.
+_NATIVE_RECYCLING = sys.version_info >= (3, 11)
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _CONTEXT = multiprocessing.get_context('forkserver')
+    # Pool processes fork from a server that has already imported the parsers.
+    _CONTEXT.set_forkserver_preload(['parse_pool'])
+else:  # pragma: no cover - Windows and macOS default to spawn
+    _CONTEXT = multiprocessing.get_context('spawn')
+
+
+def extract_document(body: bytes, extractor: str, max_chars: Optional[int]) -> Tuple[str, Optional[str]]:
+    """Parse and extract a page with the configured engine; runs in a pool process or inline."""
+    if extractor in ('lxml', 'readability'):
+        content, title = extract_with_lxml(body, max_chars=max_chars, readability=extractor == 'readability')
+        return content, title if title is not None else 'No title found'
+    return extract_with_bs4(body, max_chars=max_chars)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+class ParsePool:
+    """Runs CPU-bound parsing in worker processes so request threads only wait on I/O.
+
+    Each gunicorn worker owns one pool, created on first use and re-created
+    after a fork. On Linux the processes come from a forkserver that has
+    already imported the parsers, so starting or replacing one is cheap and
+    never copies the threads of a running gunicorn worker. Processes are
+    replaced after ``max_tasks_per_child`` pages. Python 3.11+ does this
+    natively; older versions retire the whole pool once it has served that
+    many pages per process.
+    """
+
+    def __init__(self, processes: int = 0, max_tasks_per_child: int = 200) -> None:
+        self.processes = max(0, processes)
+        self.max_tasks_per_child = max(1, max_tasks_per_child)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._submitted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def run(self, func: Callable[..., R], *args) -> R:
+        """Call ``func(*args)`` in the pool (inline when disabled) and wait for the result."""
+        if not self.enabled:
+            return func(*args)
+        try:
+            return self._submit(func, *args).result()
+        except BrokenProcessPool:
+            # A process died mid-task (for example OOM-killed); start a fresh pool next time.
+            print('Parse pool broke; restarting it')
+            self._discard()
+            return func(*args)
+
+    def ensure_started(self) -> None:
+        """Create this process's pool and start every worker process without waiting for them."""
+        if self.enabled and (self._executor is None or self._pid != os.getpid()):
+            for _ in range(self.processes):
+                self._submit(_warm_up)
+
+    def shutdown(self) -> None:
+        self._discard(wait=True)
+
+    def _submit(self, func: Callable[..., R], *args) -> 'Future[R]':
+        with self._lock:
+            pid = os.getpid()
+            if self._executor is None or self._pid != pid:
+                self._executor = self._create()
+                self._pid = pid
+                self._submitted = 0
+            elif not _NATIVE_RECYCLING and self._submitted >= self.processes * self.max_tasks_per_child:
+                retired = self._executor
+                self._executor = self._create()
+                self._submitted = 0
+                # Running tasks finish in the old processes, which then exit.
+                retired.shutdown(wait=False)
+            self._submitted += 1
+            return self._executor.submit(func, *args)
+
+    def _create(self) -> ProcessPoolExecutor:
+        # Stage timings inside pool processes are covered by the caller's 'extract' stage.
+        kwargs = {'max_workers': self.processes, 'mp_context': _CONTEXT, 'initializer': stop_recording}
+        if _NATIVE_RECYCLING:
+            kwargs['max_tasks_per_child'] = self.max_tasks_per_child
+        return ProcessPoolExecutor(**kwargs)
+
+    def _discard(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+
+PARSE_POOL = ParsePool(PARSE_PROCESSES, PARSE_MAX_TASKS)
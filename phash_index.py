@@ -0,0 +1,127 @@
+import io
+import threading
+from array import array
+from itertools import combinations
+from typing import Dict, List, Optional, Set
+
+from PIL import Image, UnidentifiedImageError
+
+HASH_BITS = 64
+
+
+def dhash(image_bytes: bytes) -> Optional[int]:
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair on a 9x8 thumbnail.
+
+    Survives re-compression, resizing and small crops or colour shifts, which
+    is how the same viral image usually comes back from another platform.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.format == 'JPEG':
+            # Decode at 1/8 scale; the hash only needs 9x8 pixels.
+            image.draft('L', (64, 64))
+        pixels = list(image.convert('L').resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        return None
+
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for column in range(8):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def hamming(left: int, right: int) -> int:
+    return bin(left ^ right).count('1')
+
+
+class NearDuplicateIndex:
+    """Bounded multi-index hash table over 64-bit perceptual hashes.
+
+    Hashes live in a fixed-size ``array('Q')`` ring, each pointing at the
+    result-cache key of the image it came from. The 64 bits are split into
+    ``chunks`` substrings with one lookup table each; by the pigeonhole
+    principle any hash within ``max_distance`` of a query differs in at most
+    ``max_distance // chunks`` bits of some substring, so only those few
+    buckets need checking instead of every stored hash.
+    """
+
+    def __init__(self, max_distance: int = 4, capacity: int = 10000, chunks: int = 4) -> None:
+        self.max_distance = max(0, max_distance)
+        self.capacity = max(0, capacity)
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+
+        self._hashes = array('Q', [0] * self.capacity)
+        self._keys: List[Optional[str]] = [None] * self.capacity
+        self._slots_by_key: Dict[str, int] = {}
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(chunks)]
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        # Bit flips to try inside each substring, e.g. 17 variants for radius 1.
+        radius = self.max_distance // chunks
+        self._flips = [0]
+        for bits in range(1, radius + 1):
+            for positions in combinations(range(self.chunk_bits), bits):
+                flip = 0
+                for position in positions:
+                    flip |= 1 << position
+                self._flips.append(flip)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.max_distance > 0
+
+    def __len__(self) -> int:
+        return len(self._slots_by_key)
+
+    def _substrings(self, value: int) -> List[int]:
+        return [(value >> (index * self.chunk_bits)) & self._mask for index in range(self.chunks)]
+
+    def add(self, value: int, key: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._slots_by_key:
+                return
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.capacity
+
+            previous_key = self._keys[slot]
+            if previous_key is not None:
+                # Overwrite the oldest entry in the ring.
+                for table, substring in zip(self._tables, self._substrings(self._hashes[slot])):
+                    bucket = table.get(substring)
+                    if bucket is not None:
+                        bucket.discard(slot)
+                        if not bucket:
+                            del table[substring]
+                del self._slots_by_key[previous_key]
+
+            self._hashes[slot] = value
+            self._keys[slot] = key
+            self._slots_by_key[key] = slot
+            for table, substring in zip(self._tables, self._substrings(value)):
+                table.setdefault(substring, set()).add(slot)
+
+    def find(self, value: int) -> Optional[str]:
+        """Return the cache key of the closest stored hash within max_distance, if any."""
+        if not self.enabled:
+            return None
+        best_key = None
+        best_distance = self.max_distance + 1
+        with self._lock:
+            seen: Set[int] = set()
+            for table, substring in zip(self._tables, self._substrings(value)):
+                for flip in self._flips:
+                    for slot in table.get(substring ^ flip, ()):
+                        if slot in seen:
+                            continue
+                        seen.add(slot)
+                        distance = hamming(self._hashes[slot], value)
+                        if distance < best_distance:
+                            best_key, best_distance = self._keys[slot], distance
+        return best_key
@@ -0,0 +1,314 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+if TYPE_CHECKING:
+    import requests
+
+
+class HostThrottled(Exception):
+    """Raised when a host cannot be contacted within the allowed wait."""
+
+    def __init__(self, host: str, retry_after: float) -> None:
+        super().__init__(f'{host} is rate limited for another {retry_after:.1f}s')
+        self.host = host
+        self.retry_after = retry_after
+
+
+class BlockedByRobots(Exception):
+    """Raised when a site's robots.txt disallows fetching a URL."""
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+def parse_host_rates(spec: str) -> Dict[str, float]:
+    """Parse "example.com=0.5,news.example.org=2" into per-host requests per second."""
+    rates = {}
+    for item in spec.split(','):
+        host, _, rate = item.partition('=')
+        try:
+            rates[host.strip().lower()] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+
+class _HostState:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'blocked_until', 'connections', 'active', 'last_used', 'rules')
+
+    def __init__(self, rate: float, burst: float, max_connections: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.connections = threading.BoundedSemaphore(max_connections)
+        self.active = 0
+        self.last_used = self.updated
+        # The robots.txt parser whose Crawl-delay ``rate`` reflects.
+        self.rules: Optional[RobotFileParser] = None
+
+
+class RobotsCache:
+    """Caches parsed robots.txt per origin, fetching each one at most once per TTL.
+
+    robots.txt is requested as ``user_agent``, the agent its rules are
+    checked for, with a single attempt of at most ``timeout`` seconds. A
+    robots.txt that answers 5xx makes the whole origin unavailable, as RFC
+    9309 asks, but only for ``error_ttl_seconds`` before it is fetched again.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], 'requests.Session'],
+        user_agent: str = '*',
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+        timeout: float = 5,
+        error_ttl_seconds: float = 60,
+    ) -> None:
+        self.session_factory = session_factory
+        self.user_agent = user_agent
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.error_ttl_seconds = error_ttl_seconds
+        # origin -> (expires_at, parser, True while robots.txt is answering 5xx)
+        self._entries: 'OrderedDict[str, Tuple[float, RobotFileParser, bool]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._origin_locks: Dict[str, threading.Lock] = {}
+
+    def parser_for(self, url: str) -> RobotFileParser:
+        return self._entry(url)[1]
+
+    def allowed(self, url: str) -> bool:
+        return self.parser_for(url).can_fetch(self.user_agent, url)
+
+    def check(self, url: str, before_fetch: Optional[Callable[[], None]] = None) -> RobotFileParser:
+        """Return the rules for ``url``'s origin, raising unless ``url`` may be fetched now.
+
+        Raises HostThrottled while robots.txt is answering 5xx and
+        BlockedByRobots when it disallows ``url``. ``before_fetch`` is called
+        only when robots.txt itself has to be requested.
+        """
+        expires_at, parser, server_error = self._entry(url, before_fetch)
+        if server_error:
+            # The site is having trouble; try again once robots.txt may have recovered.
+            raise HostThrottled((urlsplit(url).hostname or '').lower(), max(1.0, expires_at - time.monotonic()))
+        if not parser.can_fetch(self.user_agent, url):
+            raise BlockedByRobots(url)
+        return parser
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        return self.delay_in(self.parser_for(url))
+
+    def delay_in(self, parser: RobotFileParser) -> Optional[float]:
+        delay = parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+
+    def _entry(self, url: str, before_fetch: Optional[Callable[[], None]] = None) -> Tuple[float, RobotFileParser, bool]:
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'.lower()
+        entry = self._lookup(origin)
+        if entry is not None:
+            return entry
+        with self._lock:
+            origin_lock = self._origin_locks.setdefault(origin, threading.Lock())
+        # One fetch per origin; other threads wait for it instead of fetching too.
+        with origin_lock:
+            entry = self._lookup(origin)
+            if entry is None:
+                if before_fetch is not None:
+                    before_fetch()
+                parser, server_error = self._fetch(origin)
+                ttl = self.error_ttl_seconds if server_error else self.ttl_seconds
+                entry = (time.monotonic() + ttl, parser, server_error)
+                with self._lock:
+                    self._entries[origin] = entry
+                    self._entries.move_to_end(origin)
+                    while len(self._entries) > self.max_entries:
+                        evicted, _ = self._entries.popitem(last=False)
+                        self._origin_locks.pop(evicted, None)
+        return entry
+
+    def _lookup(self, origin: str) -> Optional[Tuple[float, RobotFileParser, bool]]:
+        with self._lock:
+            entry = self._entries.get(origin)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(origin)
+            return entry
+
+    def _fetch(self, origin: str) -> Tuple[RobotFileParser, bool]:
+        """Fetch and parse an origin's robots.txt, returning whether it answered 5xx."""
+        import requests
+
+        parser = RobotFileParser(origin + '/robots.txt')
+        headers = {'User-Agent': self.user_agent} if self.user_agent != '*' else None
+        try:
+            response = self.session_factory().get(parser.url, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as exc:
+            # Unreachable robots.txt: assume allowed, as most crawlers do for user-initiated fetches.
+            print(f"robots.txt fetch failed for {origin}: {exc}")
+            parser.allow_all = True
+            return parser, False
+        # RobotFileParser.read() rules for 4xx; a 5xx disallows everything
+        # (RFC 9309) until error_ttl_seconds have passed.
+        if response.status_code >= 500:
+            parser.disallow_all = True
+            return parser, True
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser, False
+
+
+class PolitenessScheduler:
+    """Per-host token buckets, connection caps and Retry-After backoff for one process.
+
+    Every fetch takes a token from its host's bucket (refilled at ``rate`` per
+    second up to ``burst``) and one of ``max_connections`` slots. A 429 or 503
+    blocks the host until its Retry-After has passed (``cooldown`` seconds
+    when the header is missing). Fetching a host's robots.txt takes a token
+    too, and its Crawl-delay caps the rate again whenever robots.txt is
+    re-fetched. Callers wait at most ``max_wait`` seconds for
+    any of this; beyond that HostThrottled is raised so the request fails fast
+    instead of tying up a worker.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: float = 5.0,
+        max_connections: int = 4,
+        max_wait: float = 5.0,
+        cooldown: float = 30.0,
+        host_rates: Optional[Dict[str, float]] = None,
+        robots: Optional[RobotsCache] = None,
+        max_hosts: int = 4096,
+    ) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_connections = max(1, max_connections)
+        self.max_wait = max_wait
+        self.cooldown = cooldown
+        self.host_rates = host_rates or {}
+        self.robots = robots
+        self.max_hosts = max_hosts
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """Hold a rate-limited connection slot for ``url``'s host while the body is read."""
+        host = (urlsplit(url).hostname or '').lower()
+        state = self._state(host)
+        deadline = time.monotonic() + self.max_wait
+        if self.robots is not None:
+            # A robots.txt request counts against the host's rate like any other.
+            rules = self.robots.check(url, before_fetch=lambda: self._take_token(host, state, deadline))
+            self._apply_crawl_delay(host, state, rules)
+
+        self._wait_until_unblocked(host, state, deadline)
+        self._take_token(host, state, deadline)
+        if not state.connections.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise HostThrottled(host, 1.0)
+        with self._lock:
+            state.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                state.active -= 1
+                state.last_used = time.monotonic()
+            state.connections.release()
+
+    def observe(self, url: str, response: 'requests.Response') -> None:
+        """Back off from a host that answered 429 or 503."""
+        if response.status_code not in (429, 503):
+            return
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        if delay is None:
+            delay = self.cooldown if response.status_code == 429 else 0.0
+        if delay <= 0:
+            return
+        host = (urlsplit(url).hostname or '').lower()
+        state = self._state(host)
+        with self._lock:
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+
+    def _state(self, host: str) -> _HostState:
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                if len(self._hosts) >= self.max_hosts:
+                    self._prune()
+                state = _HostState(self.host_rates.get(host, self.rate), self.burst, self.max_connections)
+                self._hosts[host] = state
+            return state
+
+    def _apply_crawl_delay(self, host: str, state: _HostState, rules: RobotFileParser) -> None:
+        # A re-fetched robots.txt is a new parser, so a changed Crawl-delay takes effect.
+        if state.rules is rules:
+            return
+        rate = self.host_rates.get(host, self.rate)
+        delay = self.robots.delay_in(rules)
+        if delay:
+            rate = min(rate, 1.0 / delay)
+        with self._lock:
+            state.rules = rules
+            state.rate = rate
+
+    def _prune(self) -> None:
+        # Forget idle hosts whose buckets have refilled; called with the lock held.
+        now = time.monotonic()
+        for host, state in list(self._hosts.items()):
+            idle_for = now - state.last_used
+            if not state.active and state.blocked_until <= now and idle_for * state.rate >= state.burst:
+                del self._hosts[host]
+
+    def _wait_until_unblocked(self, host: str, state: _HostState, deadline: float) -> None:
+        with self._lock:
+            blocked_until = state.blocked_until
+        remaining = blocked_until - time.monotonic()
+        if remaining <= 0:
+            return
+        if blocked_until > deadline:
+            raise HostThrottled(host, remaining)
+        time.sleep(remaining)
+
+    def _take_token(self, host: str, state: _HostState, deadline: float) -> None:
+        if state.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            state.tokens = min(state.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            # Reserve a token now (possibly going negative) so waiters are served in order.
+            state.tokens -= 1
+            wait = -state.tokens / state.rate if state.tokens < 0 else 0.0
+            if now + wait > deadline:
+                state.tokens += 1
+                raise HostThrottled(host, wait)
+        if wait:
+            time.sleep(wait)
@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import record_cache_lookup
+
+
+class ResultCache:
+    """Bounded in-memory LRU cache with TTLs and an optional SQLite tier.
+
+    The memory tier is private to each worker process. When ``db_path`` is set,
+    entries are also written to SQLite so they survive worker restarts and are
+    shared between gunicorn workers on the same host. Every 256 writes the
+    SQLite tier drops expired entries and, beyond ``max_disk_entries``, the
+    ones written longest ago (0 keeps them all).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: Optional[float] = 86400,
+        db_path: Optional[str] = None,
+        name: str = 'results',
+        max_disk_entries: int = 50000,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.max_disk_entries = max(0, int(max_disk_entries))
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.db_path = db_path or None
+        self.name = name
+
+        self._entries: 'OrderedDict[str, Tuple[Optional[float], Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._writes_since_prune = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or bool(self.db_path)
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    record_cache_lookup(self.name, True)
+                    return value
+                del self._entries[key]
+
+        found = self._disk_get(key, now)
+        record_cache_lookup(self.name, found is not None)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        value, expires_at = found
+        # Keep the disk entry's expiry; a fresh TTL would outlive the entry itself.
+        self._memory_set(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        expires_at = self._expiry(time.time())
+        self._memory_set(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        connection = self._connection()
+        if connection is None:
+            return
+        try:
+            with self._db_lock, connection:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        except sqlite3.Error as exc:
+            print(f"{self.name} cache delete failed: {exc}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        connection = self._connection()
+        if connection is None:
+            return
+        try:
+            with self._db_lock, connection:
+                connection.execute('DELETE FROM entries')
+        except sqlite3.Error as exc:
+            print(f"{self.name} cache clear failed: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'persistent': bool(self.db_path),
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _expiry(self, now: float) -> Optional[float]:
+        return now + self.ttl_seconds if self.ttl_seconds else None
+
+    def _memory_set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        pid = os.getpid()
+        # SQLite connections must not be shared across a fork, so every worker
+        # opens its own the first time it touches the disk tier.
+        if self._db is None or self._db_pid != pid:
+            with self._db_lock:
+                if self._db is None or self._db_pid != pid:
+                    try:
+                        directory = os.path.dirname(os.path.abspath(self.db_path))
+                        os.makedirs(directory, exist_ok=True)
+                        connection = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                        connection.execute('PRAGMA journal_mode=WAL')
+                        connection.execute(
+                            'CREATE TABLE IF NOT EXISTS entries ('
+                            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+                        )
+                        connection.commit()
+                    except sqlite3.Error as exc:
+                        print(f"Failed to open {self.name} cache at {self.db_path}: {exc}")
+                        self.db_path = None
+                        return None
+                    self._db = connection
+                    self._db_pid = pid
+        return self._db
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[Any, Optional[float]]]:
+        """Return ``(value, expires_at)`` for a live disk entry, or None."""
+        connection = self._connection()
+        if connection is None:
+            return None
+        try:
+            with self._db_lock:
+                row = connection.execute(
+                    'SELECT value, expires_at FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error as exc:
+            print(f"{self.name} cache read failed: {exc}")
+            return None
+        if row is None:
+            return None
+        raw_value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            return None
+        try:
+            return json.loads(raw_value), expires_at
+        except ValueError:
+            return None
+
+    def _disk_set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        connection = self._connection()
+        if connection is None:
+            return
+        try:
+            encoded = json.dumps(value)
+            with self._db_lock, connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, encoded, expires_at),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 256:
+                    self._writes_since_prune = 0
+                    self._prune(connection)
+        except (sqlite3.Error, TypeError, ValueError) as exc:
+            print(f"{self.name} cache write failed: {exc}")
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Drop expired entries, then all but the newest max_disk_entries; called inside a write."""
+        connection.execute(
+            'DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?',
+            (time.time(),),
+        )
+        if self.max_disk_entries:
+            # INSERT OR REPLACE gives every write a new, higher rowid, so rowid order is write order.
+            connection.execute(
+                'DELETE FROM entries WHERE rowid <= '
+                '(SELECT rowid FROM entries ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+                (self.max_disk_entries,),
+            )
@@ -0,0 +1,267 @@
+import itertools
+import math
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from flask import jsonify
+
+from batch_runner import run_as_completed
+from content_store import CONTENT_STORE, ContentStore, canonical_url
+from extraction import EXTRACTOR, extract_with_lxml, find_canonical_link, find_title
+from http_session import POLITENESS, VALIDATOR_CACHE, UnsupportedContentType, fetch_page, remember_validators
+from metrics import record_upstream, stage
+from parse_pool import PARSE_POOL, ParsePool, extract_document
+from politeness import BlockedByRobots, HostThrottled
+from single_flight import SingleFlight
+from soup_extraction import extract_main_content, parse_soup
+
+MAX_CONTENT_CHARS = 10000
+MIN_CONTENT_CHARS = 50
+
+# fetcher(url, cached_validators, timeout) -> (response, body). The response
+# needs ``status_code`` and ``headers``; ``http_session.fetch_page`` is the default.
+Fetcher = Callable[[str, Optional[dict], float], Tuple[Any, bytes]]
+# parser(body, max_chars) -> (content, title). Must be a module-level function
+# when SCRAPE_PARSE_PROCESSES > 0, since it is pickled into the parse pool.
+Parser = Callable[[bytes, Optional[int]], Tuple[str, Optional[str]]]
+# on_partial(fields) receives early results, such as {'title': ...}, before extraction finishes.
+OnPartial = Callable[[dict], None]
+
+BUILTIN_PARSERS = ('bs4', 'lxml', 'readability')
+PARSERS: Dict[str, Parser] = {}
+
+
+def register_parser(name: str, parser: Parser) -> None:
+    """Make ``parser`` selectable as ``Scraper(parser=name)``."""
+    if name in BUILTIN_PARSERS:
+        raise ValueError(f'{name!r} is a built-in parser')
+    PARSERS[name] = parser
+
+
+def host_of(url: Any) -> str:
+    try:
+        return (urlsplit(url).hostname or '').lower() if isinstance(url, str) else ''
+    except ValueError:
+        return ''
+
+
+class Scraper:
+    """Fetch a page and extract its main text, for the Flask services and offline jobs alike.
+
+    ``scrape(url)`` runs the whole pipeline: content store, conditional
+    revalidation, the politeness scheduler, parsing (in the parse pool when
+    enabled) and mapping every failure to an error payload and HTTP status,
+    so callers never need to handle exceptions. ``scrape_many`` does the same
+    for many URLs concurrently. The fetcher and parser are pluggable, e.g. to
+    extract from pages already on disk.
+    """
+
+    def __init__(
+        self,
+        fetcher: Optional[Fetcher] = None,
+        parser: Union[str, Parser] = EXTRACTOR,
+        max_chars: int = MAX_CONTENT_CHARS,
+        timeout: float = 10,
+        content_store: Optional[ContentStore] = CONTENT_STORE,
+        revalidate: bool = True,
+        parse_pool: ParsePool = PARSE_POOL,
+        flights: Optional[SingleFlight] = None,
+        endpoint: str = 'scrape',
+    ) -> None:
+        self.fetcher = fetcher
+        self.parser = parser
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.content_store = content_store
+        self.revalidate = revalidate
+        self.parse_pool = parse_pool
+        self.flights = flights
+        self.endpoint = endpoint
+
+    def scrape(self, url: Optional[str], on_partial: Optional[OnPartial] = None) -> Tuple[dict, int]:
+        """Scrape one URL, returning a JSON-ready payload and the HTTP status to send."""
+        if not url:
+            return {'error': 'URL is required'}, 400
+
+        # Validate URL format
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            return {'error': 'URL must start with http:// or https://'}, 400
+        try:
+            key = canonical_url(url)
+        except ValueError:
+            # urlsplit rejects malformed hosts such as "http://[::1/abc".
+            return {'error': 'URL is not valid'}, 400
+
+        if self.flights is None:
+            return self._scrape(url, on_partial)
+        # Concurrent scrapes of the same page share a single upstream fetch;
+        # only the caller that runs it sees partial results. With a content store
+        # shared between workers, a scrape that waited on another worker's lock
+        # picks up what that worker stored instead of fetching again.
+        shared_store = self.content_store is not None and bool(self.content_store.db_path)
+        payload, status = self.flights.do(
+            key, lambda: self._scrape(url, on_partial), recheck=(lambda: self._stored(url)) if shared_store else None,
+        )
+        if payload.get('url', url) != url:
+            payload = dict(payload, url=url)
+        return payload, status
+
+    def scrape_many(
+        self,
+        urls: Iterable[str],
+        window: Optional[int] = None,
+        chunk_size: int = 256,
+        on_partial: Optional[Callable[[int, str, dict], None]] = None,
+    ) -> Iterator[Tuple[int, str, dict, int]]:
+        """Scrape ``urls`` concurrently, yielding ``(index, url, payload, status)`` as each finishes.
+
+        ``urls`` may be a generator; it is consumed ``chunk_size`` at a time so
+        arbitrarily long inputs run in bounded memory. ``on_partial(index, url,
+        fields)`` is called from worker threads with early results.
+        """
+        source = iter(urls)
+        offset = 0
+        while True:
+            chunk = list(itertools.islice(source, max(1, chunk_size)))
+            if not chunk:
+                return
+
+            def work(item: Tuple[int, str]) -> Tuple[dict, int]:
+                index, url = item
+                if on_partial is None:
+                    return self.scrape(url)
+                return self.scrape(url, lambda fields: on_partial(index, url, fields))
+
+            items = [(offset + position, url) for position, url in enumerate(chunk)]
+            # Dispatch no more per host than the politeness scheduler will let connect at once.
+            completed = run_as_completed(items, work, lambda item: host_of(item[1]), window, POLITENESS.max_connections)
+            for _, (index, url), (payload, status) in completed:
+                yield index, url, payload, status
+            offset += len(chunk)
+
+    def fetch(self, url: str, cached: Optional[dict] = None) -> Tuple[Any, bytes]:
+        """Fetch ``url`` with the configured fetcher, revalidating against ``cached`` validators."""
+        fetcher = self.fetcher or fetch_page
+        with stage(self.endpoint, 'fetch'):
+            return fetcher(url, cached, self.timeout)
+
+    def extract(self, body: bytes) -> Tuple[str, str]:
+        """Extract ``(content, title)`` from an HTML body with the configured parser."""
+        parser = self.parser
+        if isinstance(parser, str) and parser in PARSERS:
+            parser = PARSERS[parser]
+
+        if callable(parser):
+            with stage(self.endpoint, 'extract'):
+                content, title = self.parse_pool.run(parser, body, self.max_chars)
+        elif self.parse_pool.enabled:
+            # Parse and extract in a worker process; this thread only waits
+            with stage(self.endpoint, 'extract'):
+                content, title = self.parse_pool.run(extract_document, body, parser, self.max_chars)
+        elif parser in ('lxml', 'readability'):
+            # Single-pass lxml extraction
+            with stage(self.endpoint, 'extract'):
+                content, title = extract_with_lxml(body, max_chars=self.max_chars, readability=parser == 'readability')
+        else:
+            # Parse HTML with BeautifulSoup
+            with stage(self.endpoint, 'parse'):
+                soup = parse_soup(body)
+
+            # Extract main content
+            with stage(self.endpoint, 'extract'):
+                content = extract_main_content(soup, max_chars=self.max_chars)
+            title = soup.title.string if soup.title else None
+        return content, title if title is not None else 'No title found'
+
+    def _stored(self, url: str) -> Optional[Tuple[dict, int]]:
+        """The content store's fresh entry for ``url`` as a scrape result, if there is one."""
+        stored = self.content_store.get(url) if self.content_store else None
+        return (dict(stored, url=url), 200) if stored is not None else None
+
+    def _scrape(self, url: str, on_partial: Optional[OnPartial] = None) -> Tuple[dict, int]:
+        """Fetch and extract a validated URL, mapping failures to an error payload and status."""
+        import requests
+
+        try:
+            # Pages extracted recently are served without any network or parse work
+            stored = self._stored(url)
+            if stored is not None:
+                return stored
+
+            cached = VALIDATOR_CACHE.get(url) if self.revalidate else None
+
+            # Reuse pooled connections, revalidate pages we have already extracted
+            # and never read more than SCRAPE_MAX_BYTES of the body
+            response, body = self.fetch(url, cached)
+            if response.status_code == 304 and cached:
+                if self.content_store:
+                    self.content_store.put([url], cached['payload']['content'], cached['payload']['title'])
+                return cached['payload'], 200
+
+            if on_partial is not None:
+                early_title = find_title(body)
+                if early_title:
+                    on_partial({'title': early_title})
+
+            content, title = self.extract(body)
+
+            if not content or len(content.strip()) < MIN_CONTENT_CHARS:
+                return {'error': 'No readable content found on the page'}, 400
+
+            # Limit content length to prevent overly long responses
+            if len(content) > self.max_chars:
+                content = content[:self.max_chars] + "..."
+
+            payload = {
+                'content': content,
+                'title': title,
+                'url': url
+            }
+            if self.revalidate:
+                remember_validators(url, response, payload)
+            if self.content_store:
+                # A same-site rel=canonical target is stored as an alias, never over a fetched page.
+                self.content_store.put([url], content, title, aliases=[canonical_url(url, find_canonical_link(body))])
+            return payload, 200
+
+        except UnsupportedContentType as e:
+            return {'error': f'Unsupported content type ({e.content_type}). Only HTML pages can be scraped.'}, 415
+
+        except HostThrottled as e:
+            record_upstream('scrape', 'throttled')
+            return {
+                'error': 'The website is being rate limited to avoid getting blocked. Please retry shortly.',
+                'retryAfter': math.ceil(e.retry_after),
+            }, 429
+
+        except BlockedByRobots:
+            record_upstream('scrape', 'robots_disallowed')
+            return {'error': "The website's robots.txt does not allow this page to be scraped."}, 403
+
+        except requests.exceptions.Timeout:
+            record_upstream('scrape', 'timeout')
+            return {'error': 'Request timed out. The website may be slow or unresponsive.'}, 408
+
+        except requests.exceptions.ConnectionError:
+            record_upstream('scrape', 'connection_error')
+            return {'error': 'Failed to connect to the website. Please check the URL and your internet connection.'}, 503
+
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                return {'error': 'Page not found (404). Please check the URL.'}, 404
+            elif e.response.status_code == 403:
+                return {'error': 'Access forbidden (403). The website may be blocking automated requests.'}, 403
+            else:
+                return {'error': f'HTTP error {e.response.status_code} occurred.'}, e.response.status_code
+
+        except Exception as e:
+            print(f"Scraping error: {str(e)}")
+            return {'error': 'An unexpected error occurred while processing the URL.'}, 500
+
+
+def scrape_response(payload: dict, status: int):
+    """Flask response for a scrape result, with Retry-After when the host is throttled."""
+    response = jsonify(payload)
+    if 'retryAfter' in payload:
+        response.headers['Retry-After'] = str(payload['retryAfter'])
+    return response, status
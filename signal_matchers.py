@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Pattern
+
+
+def build_trie_pattern(keywords: Iterable[str]) -> Optional[Pattern[str]]:
+    """Compile keywords into one regex whose alternations follow a character trie.
+
+    Shared prefixes are factored out ('render', 'rendering' -> 'render(?:ing)?'),
+    so the regex engine tests each text position against the trie instead of
+    against every keyword in turn.
+    """
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        keyword = keyword.strip().lower()
+        if not keyword:
+            continue
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    if not trie:
+        return None
+
+    def to_regex(node: Dict[str, dict]) -> str:
+        terminal = '' in node
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            # A keyword ends here, so everything after this point is optional.
+            return ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+        return body
+
+    return re.compile(to_regex(trie))
+
+
+class KeywordMatcher:
+    """Substring matcher over a keyword set, equivalent to any(k in text for k in keywords)."""
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self.keywords = frozenset(k.strip().lower() for k in keywords if k and k.strip())
+        self._pattern = build_trie_pattern(self.keywords)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def matches(self, lowered_text: str) -> bool:
+        return self._pattern is not None and self._pattern.search(lowered_text) is not None
+
+
+class DomainIndex:
+    """Suffix index over registrable domains, matching a domain and all of its subdomains."""
+
+    def __init__(self, domains: Iterable[str]) -> None:
+        self.domains = frozenset(
+            domain.strip().lower().rstrip('.') for domain in domains if domain and domain.strip()
+        )
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def matches(self, domain: str) -> bool:
+        host = domain.rsplit('@', 1)[-1].split(':', 1)[0].rstrip('.').lower()
+        if not host:
+            return False
+        labels = host.split('.')
+        # One set lookup per label: a.b.example.com checks itself, b.example.com, example.com, com.
+        return any('.'.join(labels[index:]) in self.domains for index in range(len(labels)))
+
+
+class SignalTables:
+    def __init__(self, ai_labels: Iterable[str], human_photos: Iterable[str], ai_domains: Iterable[str]) -> None:
+        self.ai_labels = KeywordMatcher(ai_labels)
+        self.human_photos = KeywordMatcher(human_photos)
+        self.ai_domains = DomainIndex(ai_domains)
+        # Changes whenever any list does, so results scored with these tables can be keyed on it.
+        digest = hashlib.sha256()
+        for values in (self.ai_labels.keywords, self.human_photos.keywords, self.ai_domains.domains):
+            digest.update('\n'.join(sorted(values)).encode('utf-8') + b'\0')
+        self.version = digest.hexdigest()[:16]
+
+
+class SignalTableLoader:
+    """Serves SignalTables built from the built-in lists plus an optional JSON file.
+
+    The file may contain any of "aiLabelKeywords", "humanPhotoKeywords" and
+    "aiHeavyDomains"; its entries are added to the built-in lists. The file's
+    mtime is checked at most every ``reload_interval`` seconds and the tables
+    are rebuilt when it changes, so lists can grow without a restart.
+    """
+
+    def __init__(
+        self,
+        ai_labels: Iterable[str],
+        human_photos: Iterable[str],
+        ai_domains: Iterable[str],
+        path: Optional[str] = None,
+        reload_interval: float = 30.0,
+    ) -> None:
+        self._defaults = (list(ai_labels), list(human_photos), list(ai_domains))
+        self.path = path or None
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._tables = SignalTables(*self._defaults)
+        self._reload_if_changed(force=True)
+
+    def get(self) -> SignalTables:
+        if self.path and time.monotonic() - self._checked_at >= self.reload_interval:
+            self._reload_if_changed()
+        return self._tables
+
+    def _reload_if_changed(self, force: bool = False) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if force:
+                    print(f"Signal keyword file not found: {self.path}")
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, encoding='utf-8') as handle:
+                    config = json.load(handle)
+            except (OSError, ValueError) as exc:
+                print(f"Failed to load signal keywords from {self.path}: {exc}")
+                return
+
+            ai_labels, human_photos, ai_domains = self._defaults
+            extra: List[List[str]] = [
+                list(config.get(key) or []) for key in ('aiLabelKeywords', 'humanPhotoKeywords', 'aiHeavyDomains')
+            ]
+            # Build fully before swapping so readers never see a half-built table.
+            self._tables = SignalTables(ai_labels + extra[0], human_photos + extra[1], ai_domains + extra[2])
+            self._mtime = mtime
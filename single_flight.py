@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+from metrics import record_coalesced
+
+T = TypeVar('T')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    Within a process, the first caller for a key runs the function and every
+    caller that arrives while it is running waits for and shares its result
+    (or exception). When ``lock_dir`` is set, leaders in different worker
+    processes also serialise on a per-key lock file; the ones that wait call
+    ``recheck`` first so they can pick up the result from a shared store
+    (such as a SQLite-backed ResultCache) instead of repeating the work.
+    """
+
+    def __init__(self, name: str, lock_dir: Optional[str] = None) -> None:
+        self.name = name
+        self.lock_dir = lock_dir if lock_dir and fcntl is not None else None
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, func: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]] = None) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            record_coalesced(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._process_lock(key, enabled=recheck is not None) as waited:
+                # Only a leader that queued behind another process can find a fresh result.
+                result = recheck() if waited and recheck is not None else None
+                call.result = result if result is not None else func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'name': self.name,
+                'inFlight': len(self._calls),
+                'executions': self.executions,
+                'shared': self.shared,
+                'crossProcess': bool(self.lock_dir),
+            }
+
+    @contextmanager
+    def _process_lock(self, key: str, enabled: bool) -> Iterator[bool]:
+        """Hold the cross-process lock for ``key``, yielding whether we had to wait for it."""
+        if not enabled or not self.lock_dir:
+            yield False
+            return
+        # One lock file per key, so unrelated keys never queue behind each other.
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        path = os.path.join(self.lock_dir, f'{self.name}-{digest}.lock')
+        waited = False
+        while True:
+            handle = open(path, 'a')
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                waited = True
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                except BaseException:
+                    handle.close()
+                    raise
+            # The holder we waited for removes the file on release; only a lock on
+            # the file currently at ``path`` excludes the next arrival.
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(current, os.fstat(handle.fileno())):
+                break
+            handle.close()
+        try:
+            yield waited
+        finally:
+            # Unlinked while still held, so the directory only holds keys in flight.
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            handle.close()
@@ -0,0 +1,100 @@
+import re
+
+from metrics import stage
+
+
+def clean_text(text):
+    """Clean extracted text by removing extra whitespace and formatting"""
+    with stage('scrape', 'clean'):
+        # Replace multiple whitespace characters with single space
+        text = re.sub(r'\s+', ' ', text)
+        # Remove leading/trailing whitespace
+        text = text.strip()
+    return text
+
+def text_length_exceeds(element, limit):
+    """Check whether an element's stripped text is longer than limit, stopping as soon as it is"""
+    offset = 0
+    start = None
+    for string in element.strings:
+        if string.strip():
+            if start is None:
+                start = offset + len(string) - len(string.lstrip())
+            if offset + len(string.rstrip()) - start > limit:
+                return True
+        offset += len(string)
+    return False
+
+def collect_text(element, max_chars=None):
+    """Extract cleaned text from an element, stopping once more than max_chars have been collected"""
+    if max_chars is None:
+        return clean_text(element.get_text())
+
+    pieces = []
+    collected = 0
+    next_check = max_chars
+    for string in element.strings:
+        pieces.append(string)
+        collected += len(string)
+        # Cleaning only ever shortens text, so re-check once the raw length passes the limit again
+        if collected > next_check:
+            text = clean_text(''.join(pieces))
+            if len(text) > max_chars:
+                return text
+            next_check = collected + max_chars
+    return clean_text(''.join(pieces))
+
+def extract_main_content(soup, max_chars=None):
+    """Extract main content from BeautifulSoup object
+
+    When max_chars is given, text collection stops shortly after that many
+    characters, which is all the caller keeps anyway.
+    """
+    # Remove script, style, and other non-content elements
+    for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form']):
+        element.decompose()
+    
+    # Try to find main content containers in order of preference
+    content_selectors = [
+        'article',
+        'main',
+        '[role="main"]',
+        '.content',
+        '.article',
+        '.post',
+        '.entry',
+        '#content',
+        '#main'
+    ]
+    
+    main_content = None
+    for selector in content_selectors:
+        main_content = soup.select_one(selector)
+        if main_content and text_length_exceeds(main_content, 100):
+            break
+    
+    # Fallback to body if no main content found
+    if not main_content:
+        main_content = soup.find('body')
+    
+    if not main_content:
+        return ""
+    
+    # Extract text and clean it
+    return collect_text(main_content, max_chars)
+
+
+def parse_soup(body):
+    """Parse a page with html.parser; bs4 is imported on first use to keep start-up fast."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(body, 'html.parser')
+
+
+def extract_with_bs4(body, max_chars=None):
+    """Parse a page with BeautifulSoup and return (main content, title) as /scrape reports them."""
+    soup = parse_soup(body)
+    content = extract_main_content(soup, max_chars=max_chars)
+    title = soup.title.string if soup.title else 'No title found'
+    # Plain str so results can be pickled without dragging the parse tree along
+    return str(content), str(title) if title is not None else None
@@ -0,0 +1,100 @@
+import json
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from flask import Response, request, stream_with_context
+
+# (event name, JSON-ready data). 'result' is a finished item; anything else,
+# such as 'partial', is progress on an item that is still running.
+Event = Tuple[str, dict]
+Emit = Callable[[str, dict], bool]
+
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+# SSE comment lines keep proxies from closing a quiet stream.
+HEARTBEAT_SECONDS = 15
+
+_DONE = object()
+
+
+def stream_mode(default: Optional[str] = None) -> Optional[str]:
+    """'ndjson' or 'sse' from ?stream= or the Accept header, else ``default``."""
+    requested = (request.args.get('stream') or '').strip().lower()
+    if requested in STREAM_MIMETYPES:
+        return requested
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return default
+
+
+def format_event(mode: str, event: str, data: dict) -> str:
+    if event == 'heartbeat':
+        return ': keepalive\n\n' if mode == 'sse' else ''
+    if mode == 'sse':
+        return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    # NDJSON result lines are the bare item; other events say what they are.
+    return json.dumps(data if event == 'result' else {'event': event, **data}) + '\n'
+
+
+def stream_response(events: Iterable[Event], mode: str) -> Response:
+    """Send events as NDJSON lines or Server-Sent Events, each flushed as soon as it is produced."""
+
+    def generate() -> Iterator[str]:
+        count = 0
+        for event, data in events:
+            count += event == 'result'
+            chunk = format_event(mode, event, data)
+            if chunk:
+                yield chunk
+        if mode == 'sse':
+            yield format_event(mode, 'done', {'count': count})
+
+    response = Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[mode])
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream.
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def relay(produce: Callable[[Emit], None], heartbeat: float = HEARTBEAT_SECONDS) -> Iterator[Event]:
+    """Run ``produce(emit)`` in a thread and yield each event it emits as soon as it does.
+
+    ``emit`` may be called from any thread (for example from pool workers
+    reporting partial results). It returns False once the client has gone
+    away, so the producer can stop early. A 'heartbeat' event is yielded
+    whenever nothing has been emitted for ``heartbeat`` seconds.
+    """
+    events: 'queue.Queue' = queue.Queue()
+    cancelled = threading.Event()
+
+    def emit(event: str, data: dict) -> bool:
+        if cancelled.is_set():
+            return False
+        events.put((event, data))
+        return True
+
+    def run() -> None:
+        try:
+            produce(emit)
+        except Exception as exc:  # pragma: no cover - defensive logging
+            print(f"Streaming producer failed: {exc}")
+            events.put(('error', {'error': 'An unexpected error occurred while streaming results.'}))
+        finally:
+            events.put(_DONE)
+
+    threading.Thread(target=run, name='stream-relay', daemon=True).start()
+    try:
+        while True:
+            try:
+                item = events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield 'heartbeat', {}
+                continue
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        cancelled.set()
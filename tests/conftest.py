@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of top-level modules; make them importable from tests/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """Stands in for the ``time`` module of the module under test; tests move ``now`` by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Install a FakeClock as ``module.time``: ``clock = fake_clock(job_queue)``."""
+
+    def install(module):
+        clock = FakeClock()
+        monkeypatch.setattr(module, 'time', clock)
+        return clock
+
+    return install
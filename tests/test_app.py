@@ -0,0 +1,100 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Invalid items never reach Vision, so no client or credentials are needed.
+    monkeypatch.setattr(app, 'get_vision_client', lambda: object())
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('base64_payload, image_url, message', [
+    (5, None, 'imageBase64 must be a base64-encoded string.'),
+    ({'data': 'QUJD'}, None, 'imageBase64 must be a base64-encoded string.'),
+    (None, 5, 'imageUrl must be a string.'),
+    (None, ['https://example.com/a.jpg'], 'imageUrl must be a string.'),
+])
+def test_resolve_image_source_rejects_non_string_fields(base64_payload, image_url, message):
+    with pytest.raises(ValueError, match=message):
+        app.resolve_image_source(None, base64_payload, image_url)
+
+
+def test_batch_reports_bad_fields_per_item(client):
+    response = client.post('/vision/analyze/batch', json={'images': [{'imageBase64': 5}, {'imageUrl': 5}, 7]})
+    assert response.status_code == 200
+    assert [(item['index'], item['status']) for item in response.get_json()['results']] == [(0, 400), (1, 400), (2, 400)]
+
+
+def test_single_analysis_rejects_non_string_url(client):
+    response = client.post('/vision/analyze', json={'imageUrl': 5})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'imageUrl must be a string.'}
+
+
+def images(*sizes):
+    from google.cloud import vision
+
+    return {f'key-{number}': vision.Image(content=b'x' * size) for number, size in enumerate(sizes)}
+
+
+def test_batch_chunks_are_capped_by_count(monkeypatch):
+    monkeypatch.setattr(app, 'VISION_BATCH_SIZE', 2)
+    chunks = list(app.vision_batch_chunks(images(10, 10, 10, 10, 10)))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_batch_chunks_are_capped_by_request_bytes(monkeypatch):
+    monkeypatch.setattr(app, 'VISION_BATCH_REQUEST_BYTES', 10_000)
+    chunks = list(app.vision_batch_chunks(images(4000, 4000, 4000, 20_000, 100)))
+    # An image over the cap on its own still gets a call of its own.
+    assert chunks == [['key-0', 'key-1'], ['key-2'], ['key-3'], ['key-4']]
+
+
+@pytest.mark.parametrize('callback_url', [5, ['https://example.com/hook'], 'ftp://example.com/hook', 'http://[::1/hook', 'https://'])
+def test_job_rejects_invalid_callback_url(client, callback_url):
+    response = client.post('/vision/jobs', json={'imageUrl': 'https://example.com/a.jpg', 'callbackUrl': callback_url})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'callbackUrl must be an http(s) URL.'}
+
+
+def test_job_rejects_callback_to_internal_host(client):
+    response = client.post('/vision/jobs', json={
+        'imageUrl': 'https://example.com/a.jpg', 'callbackUrl': 'http://169.254.169.254/latest/meta-data/',
+    })
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'callbackUrl must point at a publicly reachable host.'}
+
+
+def test_cache_key_depends_on_feature_profile(monkeypatch):
+    standard = app.build_image_cache_key(b'image', None)
+    monkeypatch.setattr(app, 'VISION_FEATURE_PROFILE', 'two-phase')
+    assert app.build_image_cache_key(b'image', None) != standard
+    assert app.build_image_cache_key(None, 'https://example.com/a.jpg').startswith('two-phase/')
+
+
+def test_cache_key_depends_on_signal_tables(monkeypatch, tmp_path):
+    keywords = tmp_path / 'signals.json'
+    keywords.write_text('{"aiLabelKeywords": ["dreamlike"]}')
+    loader = app.SignalTableLoader(
+        app.AI_LABEL_KEYWORDS, app.HUMAN_PHOTO_KEYWORDS, app.AI_HEAVY_DOMAINS, path=str(keywords), reload_interval=0,
+    )
+    before = app.build_image_cache_key(b'image', None)
+    monkeypatch.setattr(app, 'SIGNAL_TABLES', loader)
+    edited = app.build_image_cache_key(b'image', None)
+    assert edited != before
+    assert app.build_image_cache_key(b'image', None) == edited
+
+
+def test_near_duplicate_from_older_scope_is_not_served(monkeypatch):
+    monkeypatch.setattr(app, 'dhash', lambda image_bytes: 0x1234)
+    monkeypatch.setattr(app, 'NEAR_DUPLICATES', app.NearDuplicateIndex(capacity=16))
+    monkeypatch.setattr(app, 'VISION_RESULT_CACHE', app.ResultCache(max_entries=16))
+    old_key = app.build_image_cache_key(b'original', None)
+    app.VISION_RESULT_CACHE.set(old_key, {'verdict': 'stale'})
+    app.NEAR_DUPLICATES.add(0x1234, old_key)
+
+    assert app.near_duplicate_analysis(b'copy', app.build_image_cache_key(b'copy', None))[1] == {'verdict': 'stale'}
+    monkeypatch.setattr(app, 'VISION_FEATURE_PROFILE', 'full')
+    assert app.near_duplicate_analysis(b'copy', app.build_image_cache_key(b'copy', None))[1] is None
@@ -0,0 +1,129 @@
+import random
+import string
+
+import pytest
+
+from content_store import ContentStore, canonical_url, compress_text
+
+
+def article(seed, length=4000):
+    # Random letters keep compressed sizes close to one another.
+    rng = random.Random(seed)
+    return ''.join(rng.choice(string.ascii_letters + ' ') for _ in range(length))
+
+
+@pytest.fixture
+def store():
+    return ContentStore(ttl_seconds=3600, max_bytes=1 << 30)
+
+
+def fill(store, count):
+    """Store ``count`` distinct pages, page 0 read longest ago."""
+    urls = [f'https://example.com/{number}' for number in range(count)]
+    for number, url in enumerate(urls):
+        store.put([url], article(number), f'Page {number}')
+    connection = store._connection()
+    with connection:
+        for number, url in enumerate(urls):
+            connection.execute('UPDATE urls SET accessed_at = ? WHERE url = ?', (1000.0 + number, url))
+    return urls
+
+
+def evict(store, now=None):
+    connection = store._connection()
+    with connection:
+        store._evict(connection, now if now is not None else connection.execute('SELECT MAX(stored_at) FROM urls').fetchone()[0])
+
+
+def stored_urls(store):
+    return [row[0] for row in store._connection().execute('SELECT url FROM urls ORDER BY accessed_at')]
+
+
+def totals(store):
+    return store._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies').fetchone()
+
+
+def test_evict_keeps_everything_under_budget(store):
+    urls = fill(store, 5)
+    evict(store)
+    assert stored_urls(store) == urls
+
+
+def test_evict_drops_least_recently_read_down_to_90_percent(store):
+    urls = fill(store, 20)
+    _, total = totals(store)
+    store.max_bytes = int(total * 0.7)
+
+    evict(store)
+
+    remaining = stored_urls(store)
+    bodies, size = totals(store)
+    assert size <= store.max_bytes * 0.9
+    assert bodies == len(remaining)
+    # Only the oldest entries go, and no more than needed to reach the target.
+    assert remaining == urls[len(urls) - len(remaining):]
+    largest = max(len(compress_text(article(number), store.compression_level)) for number in range(len(urls)))
+    assert size + largest > store.max_bytes * 0.9
+
+
+def test_evict_keeps_body_still_shared_by_another_url(store):
+    store.put(['https://example.com/old', 'https://example.com/new'], article(1), 'Shared')
+    store.put(['https://example.com/other'], article(2), 'Other')
+    connection = store._connection()
+    with connection:
+        connection.execute("UPDATE urls SET accessed_at = 1 WHERE url = 'https://example.com/old'")
+        connection.execute("UPDATE urls SET accessed_at = 2 WHERE url = 'https://example.com/other'")
+        connection.execute("UPDATE urls SET accessed_at = 3 WHERE url = 'https://example.com/new'")
+    _, total = totals(store)
+    store.max_bytes = total - 1
+
+    evict(store)
+
+    assert stored_urls(store) == ['https://example.com/new']
+    assert store.get('https://example.com/new')['content'] == article(1)
+    assert totals(store)[0] == 1
+
+
+def test_evict_removes_expired_entries_and_their_bodies(store):
+    urls = fill(store, 3)
+    connection = store._connection()
+    with connection:
+        connection.execute('UPDATE urls SET stored_at = 0 WHERE url = ?', (urls[0],))
+
+    evict(store, now=store.ttl_seconds + 10)
+
+    assert stored_urls(store) == urls[1:]
+    assert totals(store)[0] == 2
+
+
+def test_put_runs_eviction_every_32_writes():
+    store = ContentStore(ttl_seconds=3600, max_bytes=1)
+    for number in range(31):
+        store.put([f'https://example.com/{number}'], article(number, 200), None)
+    assert len(stored_urls(store)) == 31
+    store.put(['https://example.com/last'], article(99, 200), None)
+    assert stored_urls(store) == []
+
+
+def test_alias_never_replaces_a_fetched_entry(store):
+    store.put(['https://example.com/a'], article(1), 'Fetched')
+    store.put(['https://example.com/b'], article(2), 'Claims to be a', aliases=['https://example.com/a'])
+
+    assert store.get('https://example.com/a') == {'content': article(1), 'title': 'Fetched'}
+    assert store.get('https://example.com/b')['title'] == 'Claims to be a'
+
+
+def test_alias_is_served_and_replaced_by_a_later_fetch(store):
+    store.put(['https://example.com/amp'], article(1), 'Alias', aliases=['https://example.com/story'])
+    assert store.get('https://example.com/story')['title'] == 'Alias'
+
+    store.put(['https://example.com/story'], article(2), 'Direct')
+    store.put(['https://example.com/other-amp'], article(3), 'Late alias', aliases=['https://example.com/story'])
+    assert store.get('https://example.com/story')['title'] == 'Direct'
+
+
+def test_canonical_link_only_trusted_on_same_site():
+    assert canonical_url('https://www.example.com/a?utm_source=x', '/story') == 'https://www.example.com/story'
+    assert canonical_url('https://example.com/a', 'https://www.example.com/story') == 'https://www.example.com/story'
+    assert canonical_url('https://example.com/a', 'https://evil.test/story') == 'https://example.com/a'
+    assert canonical_url('https://example.com/a', 'javascript:alert(1)') == 'https://example.com/a'
@@ -0,0 +1,64 @@
+import base64
+import binascii
+import os
+
+import pytest
+
+import image_preprocess
+from image_preprocess import PayloadTooLarge, decode_base64
+
+
+@pytest.mark.parametrize('payload', ['', 'QQ==', 'QUI=', 'QUJD', 'QUJDRA==', '+/+/', 'AAAA' * 10])
+def test_valid_input_matches_stdlib(payload):
+    assert decode_base64(payload, limit=1024) == base64.b64decode(payload, validate=True)
+
+
+@pytest.mark.parametrize('payload', ['QUJ', 'Q', 'QQ==QUJD', 'QU JD', 'QU=D', '====', 'Q===', 'QUJD!A==', 'QU\nJD'])
+def test_malformed_input_raises_like_stdlib(payload):
+    with pytest.raises(binascii.Error):
+        base64.b64decode(payload, validate=True)
+    with pytest.raises(binascii.Error):
+        decode_base64(payload, limit=1024)
+
+
+def test_surrounding_whitespace_is_ignored():
+    assert decode_base64('QUJD\n', limit=1024) == b'ABC'
+    assert decode_base64(' \r\nQUJD \r\n', limit=1024) == b'ABC'
+
+
+@pytest.mark.parametrize('size', [30, 31, 32])
+def test_limit_counts_decoded_bytes(size):
+    payload = base64.b64encode(os.urandom(size)).decode('ascii')
+    assert len(decode_base64(payload, limit=size)) == size
+    with pytest.raises(PayloadTooLarge):
+        decode_base64(payload, limit=size - 1)
+
+
+def test_oversize_payload_is_rejected_before_decoding():
+    # Malformed, but too large is reported first without decoding anything.
+    with pytest.raises(PayloadTooLarge):
+        decode_base64('!' * 4000, limit=100)
+    assert issubclass(PayloadTooLarge, ValueError)
+
+
+def test_chunks_decode_to_the_whole_payload(monkeypatch):
+    monkeypatch.setattr(image_preprocess, 'BASE64_CHUNK', 8)
+    for size in range(0, 40):
+        data = os.urandom(size)
+        assert decode_base64(base64.b64encode(data).decode('ascii'), limit=size) == data
+
+
+def test_padding_before_the_last_chunk_is_rejected(monkeypatch):
+    monkeypatch.setattr(image_preprocess, 'BASE64_CHUNK', 8)
+    # Each 8-character chunk would decode on its own.
+    with pytest.raises(binascii.Error):
+        decode_base64('QUJDQQ==QUJDQUJD', limit=1024)
+    with pytest.raises(binascii.Error):
+        decode_base64('QUJDQQ==QQ==', limit=1024)
+
+
+def test_large_payload_spanning_chunks():
+    data = os.urandom(3 * image_preprocess.BASE64_CHUNK // 4 * 2 + 5)
+    payload = base64.b64encode(data).decode('ascii')
+    assert len(payload) > 2 * image_preprocess.BASE64_CHUNK
+    assert decode_base64(payload, limit=len(data)) == data
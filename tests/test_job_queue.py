@@ -0,0 +1,199 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, QueueFull, callback_refusal
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(job_queue)
+
+
+def idle_queue(**kwargs):
+    """A queue without worker threads, so tests drive claims by hand."""
+    return JobQueue(lambda job: ({}, 200), workers=0, **kwargs)
+
+
+def wait_for_status(queue, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while queue.get(job_id)['status'] not in statuses:
+        assert time.monotonic() < deadline, 'job did not finish in time'
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_claim_takes_oldest_job_and_holds_its_lease(clock):
+    queue = idle_queue(lease_seconds=60)
+    first = queue.submit(b'one', None)
+    clock.now += 1
+    queue.submit(b'two', None)
+
+    job = queue._claim()
+    assert job['id'] == first
+    assert job['image_bytes'] == b'one'
+    assert job['attempts'] == 1
+    assert queue.get(first)['status'] == 'running'
+
+    second = queue._claim()
+    assert second['id'] != first
+    assert queue._claim() is None
+
+
+def test_expired_lease_is_claimed_again(clock):
+    queue = idle_queue(lease_seconds=60)
+    job_id = queue.submit(None, 'https://example.com/a.jpg')
+    assert queue._claim()['attempts'] == 1
+
+    clock.now += 59
+    assert queue._claim() is None
+    clock.now += 2
+    reclaimed = queue._claim()
+    assert reclaimed['id'] == job_id
+    assert reclaimed['attempts'] == 2
+
+
+def test_finished_job_is_not_reclaimed(clock):
+    queue = idle_queue(lease_seconds=60)
+    job_id = queue.submit(b'image', None)
+    queue._claim()
+    queue._finish(job_id, {'labels': []}, 200)
+
+    clock.now += 3600
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job['status'] == 'done'
+    assert job['statusCode'] == 200
+    assert job['result'] == {'labels': []}
+
+
+def test_shared_database_hands_each_job_to_one_queue(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    first, second = idle_queue(db_path=path), idle_queue(db_path=path)
+    job_ids = {first.submit(b'a', None), second.submit(b'b', None)}
+
+    claimed = [first._claim(), second._claim(), first._claim(), second._claim()]
+    assert sorted(job['id'] for job in claimed if job) == sorted(job_ids)
+    assert claimed.count(None) == 2
+
+
+def test_submit_refuses_when_pending_limit_reached(clock):
+    queue = idle_queue(max_pending=2)
+    first = queue.submit(b'a', None)
+    queue.submit(b'b', None)
+    with pytest.raises(QueueFull):
+        queue.submit(b'c', None)
+
+    queue._claim()
+    queue._finish(first, {'error': 'bad image'}, 400)
+    assert queue.get(first)['status'] == 'failed'
+    queue.submit(b'c', None)
+
+
+def test_worker_runs_handler_and_drops_image():
+    seen = []
+
+    def handler(job):
+        seen.append(job['image_bytes'])
+        return {'ok': True}, 200
+
+    queue = JobQueue(handler, workers=1, poll_interval=0.05)
+    job_id = queue.submit(b'image', None)
+    job = wait_for_status(queue, job_id, ('done', 'failed'))
+
+    assert seen == [b'image']
+    assert job['result'] == {'ok': True}
+    assert queue._connection().execute('SELECT image FROM jobs WHERE id = ?', (job_id,)).fetchone() == (None,)
+
+
+def test_job_abandoned_after_max_attempts(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    crashed = idle_queue(db_path=path, max_attempts=2)
+    job_id = crashed.submit(b'image', None)
+    # Two workers took the job and died holding it; the last lease has run out.
+    connection = crashed._connection()
+    with connection:
+        connection.execute("UPDATE jobs SET status = 'running', attempts = 2, lease_expires = 0 WHERE id = ?", (job_id,))
+
+    handled = []
+    queue = JobQueue(lambda job: handled.append(job) or ({}, 200), db_path=path, workers=1, max_attempts=2, poll_interval=0.05)
+    queue.ensure_started()
+    job = wait_for_status(queue, job_id, ('done', 'failed'))
+
+    assert handled == []
+    assert job['statusCode'] == 500
+    assert job['attempts'] == 3
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/hook',
+    'http://localhost:8080/hook',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.5/hook',
+    'http://192.168.1.1/hook',
+    'http://[::1]/hook',
+    'http://[::ffff:127.0.0.1]/hook',
+    'http://0.0.0.0/hook',
+    'ftp://93.184.216.34/hook',
+    'http://[::1/hook',
+])
+def test_callback_refused_for_internal_or_malformed_targets(url):
+    assert callback_refusal(url)
+
+
+def test_callback_allowed_for_public_address():
+    assert callback_refusal('https://93.184.216.34/hook') is None
+
+
+def test_callback_allow_list_replaces_address_check():
+    allowed = frozenset({'hooks.internal', '127.0.0.1'})
+    assert callback_refusal('http://127.0.0.1:9000/hook', allowed) is None
+    assert callback_refusal('https://93.184.216.34/hook', allowed)
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = type('Response', (), {})()
+        response.status_code = outcome
+        return response
+
+
+def deliver(monkeypatch, outcomes, url='https://93.184.216.34/hook', **kwargs):
+    session = FakeSession(outcomes)
+    monkeypatch.setattr(job_queue, 'get_http_session', lambda: session)
+    queue = idle_queue(callback_attempts=3, callback_backoff=2, **kwargs)
+    job_id = queue.submit(None, 'https://example.com/a.jpg')
+    queue._deliver_callback(url, job_id)
+    return session
+
+
+def test_callback_retried_with_backoff_after_failures(clock, monkeypatch):
+    started = clock.now
+    session = deliver(monkeypatch, [503, ConnectionError('reset'), 200])
+    assert len(session.posts) == 3
+    assert clock.now - started == 2 + 4
+    assert session.posts[0][1]['allow_redirects'] is False
+    assert session.posts[0][1]['json']['status'] == 'queued'
+
+
+def test_callback_stops_after_bounded_attempts(clock, monkeypatch):
+    session = deliver(monkeypatch, [500, 429, 502])
+    assert len(session.posts) == 3
+
+
+@pytest.mark.parametrize('status', [200, 204, 302, 404])
+def test_callback_not_retried_on_final_answer(clock, monkeypatch, status):
+    assert len(deliver(monkeypatch, [status]).posts) == 1
+
+
+def test_refused_callback_is_never_sent(clock, monkeypatch):
+    assert deliver(monkeypatch, [], url='http://169.254.169.254/latest/meta-data/').posts == []
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from phash_index import HASH_BITS, NearDuplicateIndex, hamming
+
+
+def flip_bits(value, positions):
+    for position in positions:
+        value ^= 1 << position
+    return value
+
+
+def spread(count, chunks=4, chunk_bits=16):
+    """``count`` bit positions dealt round-robin over the chunks, the hardest case for the index."""
+    return [(number % chunks) * chunk_bits + number // chunks for number in range(count)]
+
+
+def clustered(count):
+    """``count`` bit positions all inside the lowest chunk."""
+    return list(range(count))
+
+
+BASE = 0x0123456789ABCDEF
+
+
+@pytest.mark.parametrize('max_distance', [1, 3, 4, 5, 8])
+@pytest.mark.parametrize('layout', [spread, clustered])
+def test_find_matches_exactly_at_max_distance(max_distance, layout):
+    index = NearDuplicateIndex(max_distance=max_distance, capacity=16)
+    index.add(BASE, 'stored')
+
+    at_limit = flip_bits(BASE, layout(max_distance))
+    beyond = flip_bits(BASE, layout(max_distance + 1))
+    assert hamming(at_limit, BASE) == max_distance
+    assert hamming(beyond, BASE) == max_distance + 1
+
+    assert index.find(at_limit) == 'stored'
+    assert index.find(beyond) is None
+
+
+def test_find_matches_identical_hash():
+    index = NearDuplicateIndex(max_distance=4, capacity=16)
+    index.add(BASE, 'stored')
+    assert index.find(BASE) == 'stored'
+
+
+def test_find_prefers_closest_hash():
+    index = NearDuplicateIndex(max_distance=6, capacity=16)
+    index.add(flip_bits(BASE, spread(5)), 'far')
+    index.add(flip_bits(BASE, spread(2)), 'near')
+    index.add(flip_bits(BASE, spread(4)), 'middle')
+    assert index.find(BASE) == 'near'
+
+
+def test_find_agrees_with_linear_scan():
+    rng = random.Random(7)
+    index = NearDuplicateIndex(max_distance=6, capacity=512)
+    stored = {}
+    for number in range(300):
+        value = rng.getrandbits(HASH_BITS)
+        stored[f'key-{number}'] = value
+        index.add(value, f'key-{number}')
+
+    for _ in range(300):
+        origin = rng.choice(list(stored.values()))
+        query = flip_bits(origin, rng.sample(range(HASH_BITS), rng.randint(0, 8)))
+        best = min(hamming(value, query) for value in stored.values())
+        found = index.find(query)
+        if best > index.max_distance:
+            assert found is None
+        else:
+            assert hamming(stored[found], query) == best
+
+
+def test_ring_forgets_oldest_entry_at_capacity():
+    index = NearDuplicateIndex(max_distance=4, capacity=3)
+    values = [BASE, BASE ^ 0xFFFF0000, BASE ^ 0xFFFF00000000, BASE ^ 0xFFFF000000000000]
+    for number, value in enumerate(values):
+        index.add(value, f'key-{number}')
+
+    assert len(index) == 3
+    assert index.find(values[0]) is None
+    assert [index.find(value) for value in values[1:]] == ['key-1', 'key-2', 'key-3']
+
+
+def test_disabled_index_stores_nothing():
+    index = NearDuplicateIndex(max_distance=0, capacity=16)
+    index.add(BASE, 'stored')
+    assert not index.enabled
+    assert len(index) == 0
+    assert index.find(BASE) is None
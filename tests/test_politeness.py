@@ -0,0 +1,110 @@
+import pytest
+
+import http_session
+from politeness import BlockedByRobots, HostThrottled, PolitenessScheduler, RobotsCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeSession:
+    """Answers every robots.txt request with the next of ``responses``."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        return self.responses.pop(0)
+
+
+def scheduler(session, **kwargs):
+    robots = RobotsCache(lambda: session, user_agent='VeritasAI', timeout=3)
+    options = dict(rate=2.0, burst=5.0, max_wait=0.5)
+    options.update(kwargs)
+    return PolitenessScheduler(robots=robots, **options)
+
+
+def fetch(politeness, url):
+    with politeness.slot(url):
+        pass
+
+
+def expire_robots(politeness, origin):
+    _, parser, server_error = politeness.robots._entries[origin]
+    politeness.robots._entries[origin] = (0.0, parser, server_error)
+
+
+def test_robots_fetched_as_the_agent_its_rules_are_checked_for():
+    session = FakeSession(FakeResponse(200, 'User-agent: VeritasAI\nDisallow: /private\n'))
+    politeness = scheduler(session)
+
+    fetch(politeness, 'https://example.com/article')
+    with pytest.raises(BlockedByRobots):
+        fetch(politeness, 'https://example.com/private/page')
+
+    assert len(session.requests) == 1
+    url, options = session.requests[0]
+    assert url == 'https://example.com/robots.txt'
+    assert options['headers'] == {'User-Agent': 'VeritasAI'}
+    assert options['timeout'] == 3
+
+
+def test_robots_fetch_takes_a_token_from_the_host():
+    session = FakeSession(FakeResponse(404))
+    politeness = scheduler(session, rate=1.0, burst=1.0)
+
+    # The only token went to robots.txt, and the page cannot wait a second for the next.
+    with pytest.raises(HostThrottled):
+        fetch(politeness, 'https://example.com/article')
+    assert len(session.requests) == 1
+
+
+def test_cached_robots_costs_no_token():
+    session = FakeSession(FakeResponse(404))
+    politeness = scheduler(session, rate=0.001, burst=3.0)
+    fetch(politeness, 'https://example.com/a')
+    fetch(politeness, 'https://example.com/b')
+    with pytest.raises(HostThrottled):
+        fetch(politeness, 'https://example.com/c')
+
+
+def test_crawl_delay_reapplied_when_robots_is_refetched():
+    session = FakeSession(
+        FakeResponse(200, 'User-agent: *\nCrawl-delay: 10\n'),
+        FakeResponse(200, 'User-agent: *\nCrawl-delay: 1\n'),
+        FakeResponse(200, 'User-agent: *\nAllow: /\n'),
+    )
+    politeness = scheduler(session, rate=2.0, burst=5.0)
+
+    fetch(politeness, 'https://example.com/a')
+    assert politeness._hosts['example.com'].rate == pytest.approx(0.1)
+
+    expire_robots(politeness, 'https://example.com')
+    fetch(politeness, 'https://example.com/b')
+    assert politeness._hosts['example.com'].rate == pytest.approx(1.0)
+
+    expire_robots(politeness, 'https://example.com')
+    fetch(politeness, 'https://example.com/c')
+    assert politeness._hosts['example.com'].rate == pytest.approx(2.0)
+
+
+def test_robots_server_error_throttles_host():
+    session = FakeSession(FakeResponse(503))
+    politeness = scheduler(session)
+    with pytest.raises(HostThrottled) as raised:
+        fetch(politeness, 'https://example.com/a')
+    assert raised.value.retry_after == pytest.approx(60, abs=1)
+    with pytest.raises(HostThrottled):
+        fetch(politeness, 'https://example.com/b')
+    assert len(session.requests) == 1
+
+
+def test_robots_session_does_not_retry():
+    adapter = http_session.get_robots_session().get_adapter('https://example.com/robots.txt')
+    assert adapter.max_retries.total == 0
+    assert http_session.get_robots_session() is not http_session.get_http_session()
@@ -0,0 +1,33 @@
+from result_cache import ResultCache
+
+
+def disk_keys(cache):
+    return [row[0] for row in cache._connection().execute('SELECT key FROM entries ORDER BY rowid')]
+
+
+def test_disk_tier_keeps_only_newest_entries(tmp_path):
+    cache = ResultCache(max_entries=0, db_path=str(tmp_path / 'cache.db'), max_disk_entries=100)
+    for number in range(300):
+        cache.set(f'key-{number}', {'number': number})
+
+    # The prune ran on the 256th write; the 44 written since are on top of the cap.
+    assert disk_keys(cache) == [f'key-{number}' for number in range(156, 300)]
+    assert cache.get('key-155') is None
+    assert cache.get('key-299') == {'number': 299}
+
+
+def test_rewritten_entry_counts_as_new(tmp_path):
+    cache = ResultCache(max_entries=0, db_path=str(tmp_path / 'cache.db'), max_disk_entries=2)
+    for key in ('a', 'b', 'c', 'a'):
+        cache.set(key, key)
+    connection = cache._connection()
+    with connection:
+        cache._prune(connection)
+    assert disk_keys(cache) == ['c', 'a']
+
+
+def test_unbounded_disk_tier_only_drops_expired(tmp_path):
+    cache = ResultCache(max_entries=0, db_path=str(tmp_path / 'cache.db'), max_disk_entries=0)
+    for number in range(300):
+        cache.set(f'key-{number}', number)
+    assert len(disk_keys(cache)) == 300
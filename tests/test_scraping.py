@@ -0,0 +1,92 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+import single_flight
+from content_store import ContentStore, canonical_url
+from parse_pool import ParsePool
+from scraping import Scraper
+from single_flight import SingleFlight
+
+ARTICLE = 'A long enough paragraph of article text to count as readable content. ' * 3
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+
+def fetch(url, cached, timeout):
+    return FakeResponse(), b'<html><title>Page</title></html>'
+
+
+def parse(body, max_chars):
+    return ARTICLE, 'Page'
+
+
+@pytest.fixture
+def scraper():
+    return Scraper(
+        fetcher=fetch, parser=parse, content_store=None, revalidate=False,
+        parse_pool=ParsePool(processes=0), flights=SingleFlight('test-scrape'),
+    )
+
+
+@pytest.mark.parametrize('url', ['http://[::1/abc', 'https://℀.com/'])
+def test_malformed_url_is_a_client_error(scraper, url):
+    assert scraper.scrape(url) == ({'error': 'URL is not valid'}, 400)
+
+
+@pytest.mark.parametrize('url', [None, '', 5, 'ftp://example.com/'])
+def test_missing_or_non_http_url_is_rejected(scraper, url):
+    payload, status = scraper.scrape(url)
+    assert status == 400
+    assert 'error' in payload
+
+
+def test_one_malformed_url_does_not_fail_the_batch(scraper):
+    urls = ['https://example.com/a', 'http://[::1/abc', 'https://example.com/b']
+    results = {index: (url, payload, status) for index, url, payload, status in scraper.scrape_many(urls)}
+
+    assert sorted(results) == [0, 1, 2]
+    assert results[1][2] == 400
+    assert results[0][1] == {'content': ARTICLE, 'title': 'Page', 'url': 'https://example.com/a'}
+    assert results[2][2] == 200
+
+
+@pytest.mark.skipif(single_flight.fcntl is None, reason='needs fcntl')
+def test_scrape_waiting_on_another_worker_reuses_its_stored_page(tmp_path):
+    store = ContentStore(db_path=str(tmp_path / 'content.db'))
+    fetched = []
+
+    def counting_fetch(url, cached, timeout):
+        fetched.append(url)
+        return fetch(url, cached, timeout)
+
+    scraper = Scraper(
+        fetcher=counting_fetch, parser=parse, content_store=store, revalidate=False,
+        parse_pool=ParsePool(processes=0), flights=SingleFlight('scrape', lock_dir=str(tmp_path / 'locks')),
+    )
+    url = 'https://example.com/story'
+    digest = hashlib.sha256(canonical_url(url).encode('utf-8')).hexdigest()
+    path = os.path.join(str(tmp_path / 'locks'), f'scrape-{digest}.lock')
+
+    # Another worker holds the page's lock while it scrapes and stores it.
+    holder = open(path, 'a')
+    single_flight.fcntl.flock(holder.fileno(), single_flight.fcntl.LOCK_EX)
+
+    def finish_other_worker():
+        time.sleep(0.1)
+        ContentStore(db_path=str(tmp_path / 'content.db')).put([url], 'Stored by the other worker. ' * 3, 'Theirs')
+        os.unlink(path)
+        holder.close()
+
+    threading.Thread(target=finish_other_worker).start()
+    payload, status = scraper.scrape(url)
+
+    assert status == 200
+    assert payload['title'] == 'Theirs'
+    assert fetched == []
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+import single_flight
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.005)
+
+
+def run_callers(flights, key, func, count):
+    """Start ``count`` threads calling ``flights.do(key, func)``; return their outcomes and threads."""
+    outcomes = [None] * count
+
+    def caller(position):
+        try:
+            outcomes[position] = ('ok', flights.do(key, func))
+        except Exception as exc:
+            outcomes[position] = ('error', exc)
+
+    threads = [threading.Thread(target=caller, args=(position,)) for position in range(count)]
+    for thread in threads:
+        thread.start()
+    return outcomes, threads
+
+
+def test_do_returns_result_and_forgets_key():
+    flights = SingleFlight('test')
+    assert flights.do('a', lambda: 1) == 1
+    assert flights.do('a', lambda: 2) == 2
+    stats = flights.stats()
+    assert stats['executions'] == 2
+    assert stats['shared'] == 0
+    assert stats['inFlight'] == 0
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return {'value': 42}
+
+    outcomes, threads = run_callers(flights, 'key', work, 5)
+    wait_until(lambda: flights.stats()['shared'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert all(kind == 'ok' for kind, _ in outcomes)
+    # Every caller gets the very same object the leader returned.
+    assert len({id(result) for _, result in outcomes}) == 1
+    assert flights.stats() == {'name': 'test', 'inFlight': 0, 'executions': 1, 'shared': 4, 'crossProcess': False}
+
+
+def test_error_is_shared_with_waiters():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    runs = []
+
+    def fail():
+        runs.append(1)
+        release.wait(5)
+        raise ValueError('upstream down')
+
+    outcomes, threads = run_callers(flights, 'key', fail, 4)
+    wait_until(lambda: flights.stats()['shared'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert all(kind == 'error' for kind, _ in outcomes)
+    assert len({id(exc) for _, exc in outcomes}) == 1
+    assert isinstance(outcomes[0][1], ValueError)
+    # A failed call is not remembered; the next caller runs the function again.
+    assert flights.do('key', lambda: 'recovered') == 'recovered'
+
+
+def test_different_keys_run_independently():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    started = []
+
+    def work():
+        started.append(1)
+        release.wait(5)
+        return 'slow'
+
+    outcomes, threads = run_callers(flights, 'slow', work, 1)
+    wait_until(lambda: started)
+    assert flights.do('fast', lambda: 'fast') == 'fast'
+    release.set()
+    threads[0].join(5)
+    assert outcomes == [('ok', 'slow')]
+
+
+@pytest.mark.skipif(single_flight.fcntl is None, reason='needs fcntl')
+def test_leader_that_waited_for_another_process_rechecks(tmp_path):
+    flights = SingleFlight('test', lock_dir=str(tmp_path))
+    digest = hashlib.sha256(b'key').hexdigest()
+    path = os.path.join(str(tmp_path), f'test-{digest}.lock')
+
+    # Stand in for a leader in another worker process holding the key's lock.
+    holder = open(path, 'a')
+    single_flight.fcntl.flock(holder.fileno(), single_flight.fcntl.LOCK_EX)
+
+    def release_holder():
+        time.sleep(0.1)
+        os.unlink(path)
+        holder.close()
+
+    threading.Thread(target=release_holder).start()
+    result = flights.do('key', lambda: pytest.fail('should reuse the stored result'), recheck=lambda: 'stored')
+
+    assert result == 'stored'
+    assert not os.listdir(str(tmp_path))
+
+
+@pytest.mark.skipif(single_flight.fcntl is None, reason='needs fcntl')
+def test_leader_without_contention_skips_recheck(tmp_path):
+    flights = SingleFlight('test', lock_dir=str(tmp_path))
+    result = flights.do('key', lambda: 'fresh', recheck=lambda: pytest.fail('nothing to recheck'))
+    assert result == 'fresh'
+    assert not os.listdir(str(tmp_path))
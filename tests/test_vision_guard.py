@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+import vision_guard
+from vision_guard import CircuitBreaker, CircuitOpen, VisionGuard
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(vision_guard)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure()
+    assert not breaker.closed
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.closed
+    breaker.record_failure()
+    assert not breaker.closed
+
+
+def test_open_circuit_fails_fast_until_reset_timeout(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+
+    clock.now += 10
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.allow()
+    assert raised.value.retry_after == pytest.approx(20)
+
+    # Close to the end of the window, callers are told to wait at least a second.
+    clock.now += 19.9
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.allow()
+    assert raised.value.retry_after == 1.0
+
+
+def test_half_open_lets_exactly_one_probe_through(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+
+    clock.now += 30
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert not breaker.closed
+
+
+def test_successful_probe_closes_circuit(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+
+    clock.now += 30
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.closed
+    breaker.allow()
+    breaker.allow()
+    # The failure count starts over after closing.
+    breaker.record_failure()
+    assert breaker.closed
+
+
+def test_failed_probe_reopens_for_a_full_timeout(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+
+    clock.now += 31
+    breaker.allow()
+    breaker.record_failure()
+    assert not breaker.closed
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.allow()
+    assert raised.value.retry_after == pytest.approx(30)
+
+    clock.now += 30
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.closed
+
+
+def test_fast_primary_never_touches_hedge_pool():
+    guard = VisionGuard(CircuitBreaker('test'), timeout=5, hedge_after=0.5)
+    assert guard.call(lambda **kwargs: 'done', requests=[]) == 'done'
+    assert guard._executor is None
+
+
+def test_slow_primary_is_hedged_on_pool():
+    guard = VisionGuard(CircuitBreaker('test'), timeout=5, hedge_after=0.05, hedge_max_ratio=1.0)
+    calls = []
+    lock = threading.Lock()
+
+    def method(**kwargs):
+        with lock:
+            calls.append(threading.current_thread().name)
+            first = len(calls) == 1
+        if first:
+            time.sleep(0.5)
+            return 'primary'
+        return 'hedge'
+
+    assert guard.call(method) == 'hedge'
+    assert calls[0] == 'vision-primary'
+    assert calls[1].startswith('vision-hedge')
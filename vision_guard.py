@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from metrics import record_upstream, set_circuit_open
+
+R = TypeVar('R')
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f'{name} circuit is open; retry in {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures, then probes it again.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    every call fails fast with CircuitOpen for ``reset_timeout`` seconds.
+    Then a single probe call is let through (half-open): success closes the
+    circuit, failure opens it again. State is per worker process.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self._opened_at is None
+
+    def allow(self) -> None:
+        """Raise CircuitOpen unless a call may go ahead now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpen(self.name, max(remaining, 1.0))
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                print(f"{self.name} circuit closed")
+                set_circuit_open(self.name, False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            was_probing, self._probing = self._probing, False
+            if was_probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                print(f"{self.name} circuit opened after {self._failures} consecutive failures")
+                set_circuit_open(self.name, True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'closed': self.closed, 'consecutiveFailures': self._failures}
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """True for errors that say the upstream is unhealthy, not that the request was bad."""
+    from google.api_core import exceptions
+
+    if isinstance(exc, exceptions.GoogleAPICallError):
+        return isinstance(exc, (exceptions.ServerError, exceptions.TooManyRequests))
+    return True
+
+
+class VisionGuard:
+    """Deadlines, a circuit breaker and optional hedging for Vision RPCs.
+
+    Every call gets ``timeout`` seconds in total, including the client
+    library's retries of UNAVAILABLE. When ``hedge_after`` is set and the
+    first attempt has not answered by then, a second identical attempt is
+    sent and whichever succeeds first wins. The first attempt runs on a
+    thread of its own, started with the call, so ``hedge_after`` is measured
+    from when it actually began; only hedges use the ``hedge_workers`` pool,
+    and a hedge is skipped rather than queued when the pool is busy. Hedges
+    are capped at ``hedge_max_ratio`` of all calls and stop while the circuit
+    is not closed, so an incident does not double the load on Vision.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        timeout: float = 10.0,
+        hedge_after: float = 0.0,
+        hedge_max_ratio: float = 0.1,
+        hedge_workers: int = 16,
+    ) -> None:
+        self.breaker = breaker
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.hedge_max_ratio = hedge_max_ratio
+        self.hedge_workers = max(2, hedge_workers)
+        self._calls = 0
+        self._hedges = 0
+        self._hedges_running = 0
+        self._counter_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._executor_lock = threading.Lock()
+
+    def call(self, method: Callable[..., R], **kwargs) -> R:
+        """Call a Vision client method such as ``client.batch_annotate_images`` under the guard."""
+        try:
+            self.breaker.allow()
+        except CircuitOpen:
+            record_upstream('vision', 'circuit_open')
+            raise
+        deadline = time.monotonic() + self.timeout
+        try:
+            if self.hedge_after > 0 and self.hedge_after < self.timeout:
+                result = self._hedged(method, deadline, kwargs)
+            else:
+                result = method(**self._with_deadline(kwargs, deadline))
+        except Exception as exc:
+            if is_upstream_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _with_deadline(self, kwargs: dict, deadline: float) -> dict:
+        from google.api_core import exceptions
+        from google.api_core.retry import Retry, if_exception_type
+
+        remaining = max(0.001, deadline - time.monotonic())
+        # The library default retries for up to 600 s; keep retries inside our deadline.
+        retry = Retry(initial=0.1, maximum=1.0, multiplier=2.0, timeout=remaining,
+                      predicate=if_exception_type(exceptions.ServiceUnavailable))
+        return dict(kwargs, timeout=remaining, retry=retry)
+
+    def _hedged(self, method: Callable[..., R], deadline: float, kwargs: dict) -> R:
+        # The caller's thread has to stay free to return whichever attempt wins.
+        primary: 'Future[R]' = Future()
+        primary_kwargs = self._with_deadline(kwargs, deadline)
+
+        def run_primary() -> None:
+            primary.set_running_or_notify_cancel()
+            try:
+                primary.set_result(method(**primary_kwargs))
+            except BaseException as exc:
+                primary.set_exception(exc)
+
+        threading.Thread(target=run_primary, name='vision-primary', daemon=True).start()
+        with self._counter_lock:
+            self._calls += 1
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done or not self._take_hedge():
+            return primary.result()
+
+        record_upstream('vision_hedge', 'sent')
+        hedge = self._get_executor().submit(method, **self._with_deadline(kwargs, deadline))
+        hedge.add_done_callback(self._hedge_finished)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future.exception() is None:
+                    if future is hedge:
+                        record_upstream('vision_hedge', 'won')
+                    # The slower attempt finishes in the background, bounded by the same deadline.
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _take_hedge(self) -> bool:
+        if not self.breaker.closed:
+            return False
+        with self._counter_lock:
+            if self._hedges + 1 > self._calls * self.hedge_max_ratio:
+                return False
+            # A hedge that has to queue for a thread arrives too late to help.
+            if self._hedges_running >= self.hedge_workers:
+                return False
+            self._hedges += 1
+            self._hedges_running += 1
+            return True
+
+    def _hedge_finished(self, _future: Future) -> None:
+        with self._counter_lock:
+            self._hedges_running -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix='vision-hedge')
+                    self._executor_pid = pid
+        return self._executor